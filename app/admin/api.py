@@ -7,7 +7,9 @@ from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, JSONResponse, Response
 from datetime import datetime
 from app.utils.logger import logger
+import asyncio
 import os
+from collections import Counter, deque
 
 router = APIRouter(prefix="/admin/api", tags=["admin-api"])
 templates = Jinja2Templates(directory="app/templates")
@@ -269,9 +271,16 @@ async def get_provider_status(request: Request):
     providers = ["zai", "k2think", "longcat"]
     provider_stats_list = []
 
-    for provider in providers:
-        stats = await dao.get_provider_stats(provider)
-        tokens = await dao.get_tokens_by_provider(provider, enabled_only=False)
+    # 各提供商的查询互不依赖，并发执行
+    provider_results = await asyncio.gather(*(
+        asyncio.gather(
+            dao.get_provider_stats(provider),
+            dao.get_tokens_by_provider(provider, enabled_only=False),
+        )
+        for provider in providers
+    ))
+
+    for provider, (stats, tokens) in zip(providers, provider_results):
 
         # 计算成功率
         total_requests = stats.get("total_requests", 0) or 0
@@ -284,9 +293,11 @@ async def get_provider_status(request: Request):
             success_rate = "N/A"
 
         # Token 类型统计
-        user_tokens = sum(1 for t in tokens if t.get("token_type") == "user")
-        guest_tokens = sum(1 for t in tokens if t.get("token_type") == "guest")
-        unknown_tokens = sum(1 for t in tokens if t.get("token_type") == "unknown")
+        # 一次遍历统计各类型数量
+        type_counts = Counter(t.get("token_type") for t in tokens)
+        user_tokens = type_counts["user"]
+        guest_tokens = type_counts["guest"]
+        unknown_tokens = type_counts["unknown"]
 
         provider_stats_list.append({
             "name": provider,  # 小写名称（用于 URL 参数）
@@ -325,17 +336,20 @@ async def get_live_logs():
 
     # 尝试读取日志文件
     log_dir = "logs"
-    if os.path.exists(log_dir):
-        log_files = sorted([f for f in os.listdir(log_dir) if f.endswith('.log')], reverse=True)
-        if log_files:
-            log_file = os.path.join(log_dir, log_files[0])
-            try:
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    # 读取最后 50 行
-                    lines = f.readlines()[-50:]
-                    logs = lines
-            except Exception as e:
-                logs = [f"# [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 读取日志失败: {str(e)}"]
+    # 直接列目录，目录不存在时按无日志处理，省去每次轮询额外的 stat 调用；
+    # 只需要文件名最大的（最新的）日志文件，直接取最大值，不构造并排序整个列表
+    try:
+        latest_log = max((f for f in os.listdir(log_dir) if f.endswith('.log')), default=None)
+    except FileNotFoundError:
+        latest_log = None
+    if latest_log:
+        log_file = os.path.join(log_dir, latest_log)
+        try:
+            with open(log_file, 'r', encoding='utf-8') as f:
+                # 读取最后 50 行（逐行流过定长队列，内存占用与日志文件大小无关）
+                logs = list(deque(f, maxlen=50))
+        except Exception as e:
+            logs = [f"# [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 读取日志失败: {str(e)}"]
 
     if not logs:
         logs = [f"# [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 暂无日志数据"]
@@ -537,15 +551,17 @@ async def get_tokens_stats(request: Request, provider: str = "zai"):
 
     dao = get_token_dao()
 
-    # 获取提供商统计
-    stats = await dao.get_provider_stats(provider)
-
-    # 获取所有 Token 进行类型统计
-    tokens = await dao.get_tokens_by_provider(provider, enabled_only=False)
-
-    user_tokens = sum(1 for t in tokens if t.get("token_type") == "user")
-    guest_tokens = sum(1 for t in tokens if t.get("token_type") == "guest")
-    unknown_tokens = sum(1 for t in tokens if t.get("token_type") == "unknown")
+    # 并发获取提供商统计与所有 Token（用于类型统计）
+    stats, tokens = await asyncio.gather(
+        dao.get_provider_stats(provider),
+        dao.get_tokens_by_provider(provider, enabled_only=False),
+    )
+
+    # 一次遍历统计各类型数量
+    type_counts = Counter(t.get("token_type") for t in tokens)
+    user_tokens = type_counts["user"]
+    guest_tokens = type_counts["guest"]
+    unknown_tokens = type_counts["unknown"]
 
     stats_data = {
         "total_tokens": stats.get("total_tokens", 0) or 0,
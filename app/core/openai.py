@@ -2,13 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import time
-import json
+import orjson
 from typing import List, Dict, Any
 from fastapi import APIRouter, Header, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 
 from app.core.config import settings
-from app.models.schemas import OpenAIRequest, Message, ModelsResponse, Model, OpenAIResponse, Choice, Usage
+from app.models.schemas import OpenAIRequest, ModelsResponse, Model
 from app.utils.logger import get_logger
 from app.providers import get_provider_router
 from app.utils.token_pool import get_token_pool
@@ -16,6 +16,15 @@ from app.utils.token_pool import get_token_pool
 logger = get_logger()
 router = APIRouter()
 
+# 流式响应的固定响应头，Starlette 会复制成自己的头列表，可在请求间共享
+SSE_RESPONSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    # 禁止 nginx 等反向代理缓冲 SSE，保证增量及时送达客户端
+    "X-Accel-Buffering": "no",
+}
+
 # 全局提供商路由器实例
 provider_router = None
 
@@ -45,60 +54,62 @@ def create_chunk(chat_id: str, model: str, delta: Dict[str, Any], finish_reason:
     }
 
 
-async def handle_non_stream_response(stream_response, request: OpenAIRequest) -> JSONResponse:
+async def handle_non_stream_response(stream_response, request: OpenAIRequest) -> ORJSONResponse:
     """处理非流式响应"""
     logger.info("📄 开始处理非流式响应")
 
-    # 收集所有流式数据
+    # 收集所有流式数据（提供商可能产出 bytes 或 str 帧，统一按字节处理）
     full_content = []
-    async for chunk_data in stream_response():
-        if chunk_data.startswith("data: "):
-            chunk_str = chunk_data[6:].strip()
-            if chunk_str and chunk_str != "[DONE]":
-                try:
-                    chunk = json.loads(chunk_str)
-                    if "choices" in chunk and chunk["choices"]:
-                        choice = chunk["choices"][0]
-                        if "delta" in choice and "content" in choice["delta"]:
-                            content = choice["delta"]["content"]
-                            if content:
-                                full_content.append(content)
-                except json.JSONDecodeError:
-                    continue
-
-    # 构建响应
-    response_data = OpenAIResponse(
-        id=f"chatcmpl-{int(time.time())}",
-        object="chat.completion",
-        created=int(time.time()),
-        model=request.model,
-        choices=[Choice(
-            index=0,
-            message=Message(
-                role="assistant",
-                content="".join(full_content),
-                tool_calls=None
-            ),
-            finish_reason="stop"
-        )],
-        usage=Usage(
-            prompt_tokens=0,
-            completion_tokens=0,
-            total_tokens=0
-        )
-    )
+    async for chunk_data in stream_response:
+        chunk_bytes = chunk_data.encode() if isinstance(chunk_data, str) else chunk_data
+        if not chunk_bytes.startswith(b"data: "):
+            continue
+        # 不含 content 字段的帧（角色、用量、[DONE] 等）无需解析
+        if b'"content"' not in chunk_bytes:
+            continue
+        try:
+            chunk = orjson.loads(chunk_bytes[6:])
+        except orjson.JSONDecodeError:
+            continue
+        choices = chunk.get("choices")
+        if choices:
+            content = choices[0].get("delta", {}).get("content")
+            if content:
+                full_content.append(content)
+
+    # 构建响应（直接组装字典，结构与 OpenAIResponse 去除空字段后一致，省去模型校验与 model_dump）
+    created = int(time.time())
+    response_data = {
+        "id": f"chatcmpl-{created}",
+        "object": "chat.completion",
+        "created": created,
+        "model": request.model,
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": "".join(full_content),
+            },
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+        },
+    }
 
     logger.info("✅ 非流式响应处理完成")
-    return JSONResponse(content=response_data.model_dump(exclude_none=True))
+    return ORJSONResponse(content=response_data)
 
 
-@router.get("/v1/models")
+@router.get("/v1/models", response_class=ORJSONResponse)
 async def list_models():
     """List available models from all providers"""
     try:
         router_instance = get_provider_router_instance()
         models_data = router_instance.get_models_list()
-        return JSONResponse(content=models_data)
+        return ORJSONResponse(content=models_data)
     except Exception as e:
         logger.error(f"❌ 获取模型列表失败: {e}")
         # 返回默认模型列表作为后备
@@ -118,7 +129,7 @@ async def list_models():
 async def chat_completions(request: OpenAIRequest, authorization: str = Header(...)):
     """Handle chat completion requests with multi-provider architecture"""
     role = request.messages[0].role if request.messages else "unknown"
-    logger.info(f"😶‍🌫️ 收到客户端请求 - 模型: {request.model}, 流式: {request.stream}, 消息数: {len(request.messages)}, 角色: {role}, 工具数: {len(request.tools) if request.tools else 0}")
+    logger.info("😶‍🌫️ 收到客户端请求 - 模型: {}, 流式: {}, 消息数: {}, 角色: {}, 工具数: {}", request.model, request.stream, len(request.messages), role, len(request.tools) if request.tools else 0)
 
     # 获取提供商信息（用于统计）
     provider = "unknown"
@@ -160,11 +171,7 @@ async def chat_completions(request: OpenAIRequest, authorization: str = Header(.
                 return StreamingResponse(
                     result,
                     media_type="text/event-stream",
-                    headers={
-                        "Cache-Control": "no-cache",
-                        "Connection": "keep-alive",
-                        "Access-Control-Allow-Origin": "*",
-                    }
+                    headers=SSE_RESPONSE_HEADERS,
                 )
             else:
                 # 结果是字典，可能包含错误
@@ -172,7 +179,8 @@ async def chat_completions(request: OpenAIRequest, authorization: str = Header(.
         else:
             # 非流式响应
             if isinstance(result, dict):
-                return JSONResponse(content=result)
+                # 结果已是纯 JSON 字典，直接由 orjson 序列化，跳过 jsonable_encoder
+                return ORJSONResponse(content=result)
             else:
                 # 如果是异步生成器，需要收集所有内容
                 return await handle_non_stream_response(result, request)
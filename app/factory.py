@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+FastAPI 应用工厂
+
+集中完成应用的生命周期、中间件、静态文件与路由注册，入口文件只负责日志与服务器启动。
+"""
+
+import os
+import asyncio
+import anyio
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.staticfiles import StaticFiles
+
+from app.core.config import settings
+from app.core import openai
+from app.utils.logger import get_logger
+from app.providers import initialize_providers, provider_registry
+from app.utils.http_client import close_http_clients
+
+logger = get_logger()
+
+# 根路径的固定响应内容
+ROOT_MESSAGE = {"message": "OpenAI Compatible API Server"}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 放宽 AnyIO 默认线程池上限（40），避免同步调用在并发下排队
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREAD_POOL_SIZE
+
+    # 初始化 Token 数据库与提供商系统（互不依赖，并发进行；
+    # 提供商初始化包含同步网络请求，放到线程中执行）
+    from app.services.token_dao import init_token_database
+    await asyncio.gather(
+        init_token_database(),
+        asyncio.to_thread(initialize_providers),
+    )
+
+    # 从数据库初始化 token 池（Z.AI 提供商）
+    from app.utils.token_pool import initialize_token_pool_from_db
+    token_pool = await initialize_token_pool_from_db(
+        provider="zai",
+        failure_threshold=settings.TOKEN_FAILURE_THRESHOLD,
+        recovery_timeout=settings.TOKEN_RECOVERY_TIMEOUT
+    )
+
+    if not token_pool and not settings.ANONYMOUS_MODE:
+        logger.warning("⚠️ 未找到可用 Token 且未启用匿名模式，服务可能无法正常工作")
+
+    # 匿名模式下后台预取访客令牌
+    zai_provider = provider_registry.get_provider_by_name("zai")
+    if settings.ANONYMOUS_MODE and zai_provider:
+        zai_provider.start_guest_token_prefetch()
+
+    yield
+
+    logger.info("🔄 应用正在关闭...")
+
+    if zai_provider:
+        await zai_provider.stop_guest_token_prefetch()
+
+    # 关闭共享的上游 HTTP 客户端
+    await close_http_clients()
+
+    # 等待队列中的日志全部写出
+    await logger.complete()
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    带缓存头的静态文件
+
+    带版本参数（?v=...）引用的资源内容不会变化，允许浏览器长期缓存；
+    其余资源缓存一天，避免管理后台每次导航都重新下载。
+    """
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            if "v" in query:
+                response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+            else:
+                response.headers["Cache-Control"] = "public, max-age=86400"
+        return response
+
+
+def _register_admin(app: FastAPI) -> None:
+    """注册管理后台路由（模板、会话等依赖仅在启用时导入）"""
+    from app.admin import routes as admin_routes
+    from app.admin import api as admin_api
+
+    app.include_router(admin_routes.router)
+    app.include_router(admin_api.router)
+
+
+def create_app() -> FastAPI:
+    """创建并配置 FastAPI 应用"""
+    # Create FastAPI app with lifespan
+    # root_path is used for reverse proxy path prefix (e.g., /api or /path-prefix)
+    app = FastAPI(
+        lifespan=lifespan,
+        root_path=settings.ROOT_PATH,
+        default_response_class=ORJSONResponse,
+    )
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"],
+        max_age=86400,  # 预检结果缓存 24 小时，重复调用不必每次先发 OPTIONS
+    )
+
+    # 压缩较大的 JSON/HTML 响应；text/event-stream 流式响应由中间件自动跳过
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+    # 挂载web端静态文件目录（目录不存在时先创建，只挂载一次）
+    os.makedirs("app/static/css", exist_ok=True)
+    os.makedirs("app/static/js", exist_ok=True)
+    app.mount("/static", CachedStaticFiles(directory="app/static", check_dir=False), name="static")
+
+    # Include API routers
+    app.include_router(openai.router)
+
+    # Include admin routers
+    if settings.ENABLE_ADMIN:
+        _register_admin(app)
+
+    @app.get("/", response_model=None, include_in_schema=False)
+    async def root():
+        """Root endpoint"""
+        return ORJSONResponse(ROOT_MESSAGE)
+
+    @app.get("/healthz", response_model=None, include_in_schema=False)
+    async def healthz():
+        """负载均衡健康检查，返回固定的纯文本"""
+        return Response(b"ok", media_type="text/plain")
+
+    return app
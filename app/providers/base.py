@@ -6,7 +6,7 @@
 定义统一的提供商接口规范
 """
 
-import json
+import orjson
 import time
 import uuid
 from abc import ABC, abstractmethod
@@ -53,7 +53,7 @@ class BaseProvider(ABC):
         self, 
         request: OpenAIRequest,
         **kwargs
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """
         聊天完成接口
         
@@ -63,7 +63,7 @@ class BaseProvider(ABC):
             
         Returns:
             非流式: Dict[str, Any] - OpenAI格式的响应
-            流式: AsyncGenerator[str, None] - SSE格式的流式响应
+            流式: AsyncGenerator[bytes, None] - SSE格式的流式响应
         """
         pass
     
@@ -85,7 +85,7 @@ class BaseProvider(ABC):
         self, 
         response: Any, 
         request: OpenAIRequest
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """
         转换提供商响应为OpenAI格式
         
@@ -94,7 +94,7 @@ class BaseProvider(ABC):
             request: 原始请求（用于构造响应）
             
         Returns:
-            Union[Dict[str, Any], AsyncGenerator[str, None]]: OpenAI格式的响应
+            Union[Dict[str, Any], AsyncGenerator[bytes, None]]: OpenAI格式的响应
         """
         pass
     
@@ -195,24 +195,24 @@ class BaseProvider(ABC):
             "system_fingerprint": f"fp_{self.name}_001",
         }
 
-    async def format_sse_chunk(self, chunk: Dict[str, Any]) -> str:
-        """格式化SSE响应块"""
-        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    async def format_sse_chunk(self, chunk: Dict[str, Any]) -> bytes:
+        """格式化SSE响应块（直接产出字节，省去 orjson 输出解码后再由响应层编码的往返）"""
+        return b"data: " + orjson.dumps(chunk) + b"\n\n"
     
-    async def format_sse_done(self) -> str:
+    async def format_sse_done(self) -> bytes:
         """格式化SSE结束标记"""
-        return "data: [DONE]\n\n"
+        return b"data: [DONE]\n\n"
     
     def log_request(self, request: OpenAIRequest):
         """记录请求日志"""
-        self.logger.info(f"🔄 {self.name} 处理请求: {request.model}")
-        self.logger.debug(f"  消息数量: {len(request.messages)}")
-        self.logger.debug(f"  流式模式: {request.stream}")
+        self.logger.info("🔄 {} 处理请求: {}", self.name, request.model)
+        self.logger.debug("  消息数量: {}", len(request.messages))
+        self.logger.debug("  流式模式: {}", request.stream)
         
     def log_response(self, success: bool, error: Optional[str] = None):
         """记录响应日志"""
         if success:
-            self.logger.info(f"✅ {self.name} 响应成功")
+            self.logger.info("✅ {} 响应成功", self.name)
         else:
             self.logger.error(f"❌ {self.name} 响应失败: {error}")
     
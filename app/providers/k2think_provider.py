@@ -5,7 +5,7 @@
 K2Think 提供商适配器
 """
 
-import json
+import orjson
 import re
 import time
 import uuid
@@ -14,10 +14,20 @@ from typing import Dict, List, Any, Optional, AsyncGenerator, Union
 
 from app.providers.base import BaseProvider, ProviderConfig
 from app.models.schemas import OpenAIRequest, Message
+from app.core.config import settings
 from app.utils.logger import get_logger
+from app.utils.http_client import get_http_client
+from app.utils.sse import iter_sse_events
 
 logger = get_logger()
 
+# 上游 data 负载中表示流结束的标记
+_END_MARKERS = frozenset((b"-1", b"[DONE]", b"DONE", b"done"))
+
+# 内容解析正则表达式 - 使用DOTALL标志确保.匹配换行符，模块加载时编译一次
+_REASONING_PATTERN = re.compile(r'<details type="reasoning"[^>]*>.*?<summary>.*?</summary>(.*?)</details>', re.DOTALL)
+_ANSWER_PATTERN = re.compile(r'<answer>(.*?)</answer>', re.DOTALL)
+
 
 class K2ThinkProvider(BaseProvider):
     """K2Think 提供商"""
@@ -49,10 +59,6 @@ class K2ThinkProvider(BaseProvider):
         # K2Think 特定配置
         self.handshake_url = "https://www.k2think.ai/guest"
         self.new_chat_url = "https://www.k2think.ai/api/v1/chats/guest/new"
-        
-        # 内容解析正则表达式 - 使用DOTALL标志确保.匹配换行符
-        self.reasoning_pattern = re.compile(r'<details type="reasoning"[^>]*>.*?<summary>.*?</summary>(.*?)</details>', re.DOTALL)
-        self.answer_pattern = re.compile(r'<answer>(.*?)</answer>', re.DOTALL)
     
     def get_supported_models(self) -> List[str]:
         """获取支持的模型列表"""
@@ -72,10 +78,11 @@ class K2ThinkProvider(BaseProvider):
             return "", ""
         
         try:
-            reasoning_match = self.reasoning_pattern.search(content)
+            # 闭合标签尚未出现时正则不可能匹配，跳过搜索，避免思考阶段对整段内容反复回溯
+            reasoning_match = _REASONING_PATTERN.search(content) if "</details>" in content else None
             reasoning = reasoning_match.group(1).strip() if reasoning_match else ""
             
-            answer_match = self.answer_pattern.search(content)
+            answer_match = _ANSWER_PATTERN.search(content) if "</answer>" in content else None
             answer = answer_match.group(1).strip() if answer_match else ""
             
             return reasoning, answer
@@ -83,6 +90,11 @@ class K2ThinkProvider(BaseProvider):
             self.logger.error(f"提取K2内容错误: {e}")
             return "", ""
     
+    def extract_answer(self, content: str) -> str:
+        """仅提取答案内容"""
+        answer_match = _ANSWER_PATTERN.search(content) if content and "</answer>" in content else None
+        return answer_match.group(1).strip() if answer_match else ""
+
     def calculate_delta(self, previous: str, current: str) -> str:
         """计算内容增量"""
         if not previous:
@@ -116,21 +128,22 @@ class K2ThinkProvider(BaseProvider):
         headers_for_handshake = {**self.config.headers}
         headers_for_handshake['Accept-Encoding'] = 'gzip, deflate'  # 移除br和zstd
 
-        async with httpx.AsyncClient() as client:
-            handshake_response = await client.get(
-                self.handshake_url,
-                headers=headers_for_handshake,
-                follow_redirects=True
-            )
-            if not handshake_response.is_success:
-                try:
-                    # 使用httpx的text属性，它会自动处理解压缩和编码
-                    error_text = handshake_response.text
-                    raise Exception(f"K2 握手失败: {handshake_response.status_code} {error_text[:200]}")
-                except Exception as e:
-                    raise Exception(f"K2 握手失败: {handshake_response.status_code}")
-            
-            initial_cookies = self.parse_cookies(handshake_response.headers)
+        client = get_http_client()
+        handshake_response = await client.get(
+            self.handshake_url,
+            headers=headers_for_handshake,
+            timeout=5.0,
+            follow_redirects=True
+        )
+        if not handshake_response.is_success:
+            try:
+                # 使用httpx的text属性，它会自动处理解压缩和编码
+                error_text = handshake_response.text
+                raise Exception(f"K2 握手失败: {handshake_response.status_code} {error_text[:200]}")
+            except Exception as e:
+                raise Exception(f"K2 握手失败: {handshake_response.status_code}")
+        
+        initial_cookies = self.parse_cookies(handshake_response.headers)
         
         # 2. 准备消息
         prepared_messages = self.prepare_k2_messages(request.messages)
@@ -180,43 +193,44 @@ class K2ThinkProvider(BaseProvider):
         headers_with_cookies = {**self.config.headers, 'Cookie': initial_cookies}
         headers_with_cookies['Accept-Encoding'] = 'gzip, deflate'  # 移除br和zstd
 
-        async with httpx.AsyncClient() as client:
-            new_chat_response = await client.post(
-                self.new_chat_url,
-                headers=headers_with_cookies,
-                json=new_chat_payload,
-                follow_redirects=True
-            )
-            if not new_chat_response.is_success:
-                try:
-                    # 使用httpx的text属性，它会自动处理解压缩和编码
-                    error_text = new_chat_response.text
-                except Exception:
-                    error_text = f"Status: {new_chat_response.status_code}"
-                raise Exception(f"K2 新对话创建失败: {new_chat_response.status_code} {error_text[:200]}")
+        client = get_http_client()
+        new_chat_response = await client.post(
+            self.new_chat_url,
+            headers=headers_with_cookies,
+            content=orjson.dumps(new_chat_payload),
+            timeout=5.0,
+            follow_redirects=True
+        )
+        if not new_chat_response.is_success:
+            try:
+                # 使用httpx的text属性，它会自动处理解压缩和编码
+                error_text = new_chat_response.text
+            except Exception:
+                error_text = f"Status: {new_chat_response.status_code}"
+            raise Exception(f"K2 新对话创建失败: {new_chat_response.status_code} {error_text[:200]}")
 
+        try:
+            new_chat_data = orjson.loads(new_chat_response.content)
+        except Exception as e:
+            # 如果JSON解析失败，尝试获取原始内容
             try:
-                new_chat_data = new_chat_response.json()
-            except Exception as e:
-                # 如果JSON解析失败，尝试获取原始内容
+                # 使用httpx的text属性，它会自动处理解压缩和编码
+                content_str = new_chat_response.text
+                self.logger.debug("K2 响应原始内容: {}", content_str[:500])
+                raise Exception(f"K2 响应JSON解析失败: {e}, 原始内容: {content_str[:200]}")
+            except Exception as decode_error:
+                # 如果text也失败，尝试手动处理
                 try:
-                    # 使用httpx的text属性，它会自动处理解压缩和编码
-                    content_str = new_chat_response.text
-                    self.logger.debug(f"K2 响应原始内容: {content_str[:500]}")
-                    raise Exception(f"K2 响应JSON解析失败: {e}, 原始内容: {content_str[:200]}")
-                except Exception as decode_error:
-                    # 如果text也失败，尝试手动处理
-                    try:
-                        raw_bytes = new_chat_response.content
-                        content_str = raw_bytes.decode('utf-8', errors='replace')
-                        raise Exception(f"K2 响应解析失败: {e}, 手动解码内容: {content_str[:200]}")
-                    except Exception:
-                        raise Exception(f"K2 响应解析完全失败: {e}, 解码错误: {decode_error}")
-            conversation_id = new_chat_data.get("id")
-            if not conversation_id:
-                raise Exception("无法从K2 /new端点获取conversation_id")
-            
-            chat_specific_cookies = self.parse_cookies(new_chat_response.headers)
+                    raw_bytes = new_chat_response.content
+                    content_str = raw_bytes.decode('utf-8', errors='replace')
+                    raise Exception(f"K2 响应解析失败: {e}, 手动解码内容: {content_str[:200]}")
+                except Exception:
+                    raise Exception(f"K2 响应解析完全失败: {e}, 解码错误: {decode_error}")
+        conversation_id = new_chat_data.get("id")
+        if not conversation_id:
+            raise Exception("无法从K2 /new端点获取conversation_id")
+        
+        chat_specific_cookies = self.parse_cookies(new_chat_response.headers)
         
         # 4. 组合最终Cookie
         base_cookies = [initial_cookies, chat_specific_cookies]
@@ -279,7 +293,7 @@ class K2ThinkProvider(BaseProvider):
         self,
         transformed: Dict[str, Any],
         request: OpenAIRequest
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
         """处理流式请求 - 在client.stream上下文内直接处理"""
         chat_id = self.create_chat_id()
         model = transformed["model"]
@@ -288,112 +302,119 @@ class K2ThinkProvider(BaseProvider):
         headers_for_request = {**transformed["headers"]}
         headers_for_request['Accept-Encoding'] = 'gzip, deflate'
 
-        self.logger.info(f"🌊 开始K2Think流式请求")
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            async with client.stream(
-                "POST",
-                transformed["url"],
-                headers=headers_for_request,
-                json=transformed["payload"]
-            ) as response:
-                if not response.is_success:
-                    error_msg = f"K2Think API 错误: {response.status_code}"
-                    self.log_response(False, error_msg)
-                    # 对于流式响应，我们需要yield错误信息
-                    yield await self.format_sse_chunk({
-                        "error": {
-                            "message": error_msg,
-                            "type": "provider_error",
-                            "code": "api_error"
-                        }
-                    })
-                    return
+        self.logger.info("🌊 开始K2Think流式请求")
+
+        client = get_http_client()
+        async with client.stream(
+            "POST",
+            transformed["url"],
+            headers=headers_for_request,
+            content=orjson.dumps(transformed["payload"])
+        ) as response:
+            if not response.is_success:
+                error_msg = f"K2Think API 错误: {response.status_code}"
+                self.log_response(False, error_msg)
+                # 对于流式响应，我们需要yield错误信息
+                yield await self.format_sse_chunk({
+                    "error": {
+                        "message": error_msg,
+                        "type": "provider_error",
+                        "code": "api_error"
+                    }
+                })
+                return
 
-                # 发送初始角色块
-                yield await self.format_sse_chunk(
-                    self.create_openai_chunk(chat_id, model, {"role": "assistant"})
-                )
+            # 发送初始角色块
+            yield await self.format_sse_chunk(
+                self.create_openai_chunk(chat_id, model, {"role": "assistant"})
+            )
 
-                # 处理流式数据
-                accumulated_content = ""
-                previous_reasoning = ""
-                previous_answer = ""
-                reasoning_phase = True
-                chunk_count = 0
+            # 处理流式数据
+            accumulated_content = ""
+            previous_reasoning = ""
+            previous_answer = ""
+            reasoning_phase = True
+            chunk_count = 0
+            debug_logging = settings.DEBUG_LOGGING
 
-                try:
-                    async for line in response.aiter_lines():
-                        chunk_count += 1
-                        self.logger.debug(f"📦 收到数据块 #{chunk_count}: {line[:100]}...")
+            try:
+                async for data, frame in iter_sse_events(response):
+                    chunk_count += 1
+                    if debug_logging:
+                        self.logger.debug("📦 收到数据块 #{}: {}...", chunk_count, frame[:100].decode("utf-8", "ignore"))
 
-                        if not line.startswith("data:"):
-                            continue
+                    if data is None:
+                        continue
 
-                        data_str = line[5:].strip()
-                        if self._is_end_marker(data_str):
-                            self.logger.debug(f"🏁 检测到结束标记: {data_str}")
-                            continue
+                    if self._is_end_marker(data):
+                        self.logger.debug("🏁 检测到结束标记: {}", data)
+                        continue
 
-                        content = self._parse_data_string(data_str)
-                        if not content:
-                            continue
+                    content = self._parse_data_string(data)
+                    if not content:
+                        continue
 
-                        accumulated_content = content
+                    accumulated_content = content
+                    if reasoning_phase:
                         current_reasoning, current_answer = self.extract_reasoning_and_answer(accumulated_content)
+                    else:
+                        # 上游每次发送完整累计内容；推理阶段结束后推理部分不再变化，只需匹配答案
+                        current_answer = self.extract_answer(accumulated_content)
+
+                    # 处理推理阶段
+                    if reasoning_phase and current_reasoning:
+                        delta = self.calculate_delta(previous_reasoning, current_reasoning)
+                        if delta.strip():
+                            if debug_logging:
+                                self.logger.debug("🧠 推理增量: {}...", delta[:50])
+                            yield await self.format_sse_chunk(
+                                self.create_openai_chunk(chat_id, model, {"reasoning_content": delta})
+                            )
+                            previous_reasoning = current_reasoning
+
+                    # 切换到答案阶段
+                    if current_answer and reasoning_phase:
+                        reasoning_phase = False
+                        self.logger.debug("🔄 切换到答案阶段")
+                        # 发送剩余的推理内容
+                        final_reasoning_delta = self.calculate_delta(previous_reasoning, current_reasoning)
+                        if final_reasoning_delta.strip():
+                            yield await self.format_sse_chunk(
+                                self.create_openai_chunk(chat_id, model, {"reasoning_content": final_reasoning_delta})
+                            )
+
+                    # 处理答案阶段
+                    if not reasoning_phase and current_answer:
+                        delta = self.calculate_delta(previous_answer, current_answer)
+                        if delta.strip():
+                            if debug_logging:
+                                self.logger.debug("💬 答案增量: {}...", delta[:50])
+                            yield await self.format_sse_chunk(
+                                self.create_openai_chunk(chat_id, model, {"content": delta})
+                            )
+                            previous_answer = current_answer
 
-                        # 处理推理阶段
-                        if reasoning_phase and current_reasoning:
-                            delta = self.calculate_delta(previous_reasoning, current_reasoning)
-                            if delta.strip():
-                                self.logger.debug(f"🧠 推理增量: {delta[:50]}...")
-                                yield await self.format_sse_chunk(
-                                    self.create_openai_chunk(chat_id, model, {"reasoning_content": delta})
-                                )
-                                previous_reasoning = current_reasoning
-
-                        # 切换到答案阶段
-                        if current_answer and reasoning_phase:
-                            reasoning_phase = False
-                            self.logger.debug("🔄 切换到答案阶段")
-                            # 发送剩余的推理内容
-                            final_reasoning_delta = self.calculate_delta(previous_reasoning, current_reasoning)
-                            if final_reasoning_delta.strip():
-                                yield await self.format_sse_chunk(
-                                    self.create_openai_chunk(chat_id, model, {"reasoning_content": final_reasoning_delta})
-                                )
-
-                        # 处理答案阶段
-                        if not reasoning_phase and current_answer:
-                            delta = self.calculate_delta(previous_answer, current_answer)
-                            if delta.strip():
-                                self.logger.debug(f"💬 答案增量: {delta[:50]}...")
-                                yield await self.format_sse_chunk(
-                                    self.create_openai_chunk(chat_id, model, {"content": delta})
-                                )
-                                previous_answer = current_answer
-
-                except Exception as e:
-                    self.logger.error(f"流式响应处理错误: {e}")
-                    yield await self.format_sse_chunk({
-                        "error": {
-                            "message": f"流式处理错误: {str(e)}",
-                            "type": "stream_error",
-                            "code": "processing_error"
-                        }
-                    })
-                    return
+            except Exception as e:
+                self.logger.error(f"流式响应处理错误: {e}")
+                yield await self.format_sse_chunk({
+                    "error": {
+                        "message": f"流式处理错误: {str(e)}",
+                        "type": "stream_error",
+                        "code": "processing_error"
+                    }
+                })
+                return
 
-                # 发送结束块
-                self.logger.info(f"✅ K2Think流式响应完成，共处理 {chunk_count} 个数据块")
-                yield await self.format_sse_chunk(
-                    self.create_openai_chunk(chat_id, model, {}, "stop")
-                )
-                yield await self.format_sse_done()
+            # 发送结束块
+            self.logger.info("✅ K2Think流式响应完成，共处理 {} 个数据块", chunk_count)
+            yield await self.format_sse_chunk(
+                self.create_openai_chunk(chat_id, model, {}, "stop")
+            )
+            yield await self.format_sse_done()
 
     async def transform_request(self, request: OpenAIRequest) -> Dict[str, Any]:
         """转换OpenAI请求为K2Think格式"""
-        self.logger.info(f"🔄 转换 OpenAI 请求到 K2Think 格式: {request.model}")
+        self.logger.info("🔄 转换 OpenAI 请求到 K2Think 格式: {}", request.model)
         
         auth_data = await self.get_k2_auth_data(request)
         
@@ -407,7 +428,7 @@ class K2ThinkProvider(BaseProvider):
     async def chat_completion(
         self,
         request: OpenAIRequest
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """聊天完成接口"""
         self.log_request(request)
 
@@ -424,20 +445,20 @@ class K2ThinkProvider(BaseProvider):
                 return self._handle_stream_request(transformed, request)
             else:
                 # 非流式请求 - 使用传统的 client.post()
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(
-                        transformed["url"],
-                        headers=headers_for_request,
-                        json=transformed["payload"]
-                    )
+                client = get_http_client()
+                response = await client.post(
+                    transformed["url"],
+                    headers=headers_for_request,
+                    content=orjson.dumps(transformed["payload"])
+                )
 
-                    if not response.is_success:
-                        error_msg = f"K2Think API 错误: {response.status_code}"
-                        self.log_response(False, error_msg)
-                        return self.handle_error(Exception(error_msg))
+                if not response.is_success:
+                    error_msg = f"K2Think API 错误: {response.status_code}"
+                    self.log_response(False, error_msg)
+                    return self.handle_error(Exception(error_msg))
 
-                    # 转换非流式响应
-                    return await self.transform_response(response, request, transformed)
+                # 转换非流式响应
+                return await self.transform_response(response, request, transformed)
 
         except Exception as e:
             self.log_response(False, str(e))
@@ -457,18 +478,18 @@ class K2ThinkProvider(BaseProvider):
         # 这里只处理非流式请求
         return await self._handle_non_stream_response(response, chat_id, model)
 
-    def _is_end_marker(self, data: str) -> bool:
+    def _is_end_marker(self, data: bytes) -> bool:
         """检查是否为结束标记"""
-        return not data or data in ["-1", "[DONE]", "DONE", "done"]
+        return not data or data in _END_MARKERS
     
-    def _parse_data_string(self, data_str: str) -> str:
-        """解析数据字符串"""
+    def _parse_data_string(self, data: bytes) -> str:
+        """解析 data 负载（字节），非 JSON 时按原始文本返回"""
         try:
-            obj = json.loads(data_str)
+            obj = orjson.loads(data)
             content, is_done = self.parse_api_response(obj)
             return "" if is_done else content
         except:
-            return data_str
+            return data.decode("utf-8", "replace")
     
     async def _handle_non_stream_response(
         self,
@@ -477,20 +498,15 @@ class K2ThinkProvider(BaseProvider):
         model: str
     ) -> Dict[str, Any]:
         """处理K2Think非流式响应"""
-        # 聚合流式内容 - 使用httpx的aiter_lines，它会自动处理解压缩
+        # 聚合流式内容 - 按 SSE 事件读取字节，httpx 会自动处理解压缩
         final_content = ""
 
         try:
-            # 使用aiter_lines()，httpx会自动处理压缩和编码
-            async for line in response.aiter_lines():
-                if not line.startswith("data:"):
-                    continue
-
-                data_str = line[5:].strip()
-                if self._is_end_marker(data_str):
+            async for data, _ in iter_sse_events(response):
+                if data is None or self._is_end_marker(data):
                     continue
 
-                content = self._parse_data_string(data_str)
+                content = self._parse_data_string(data)
                 if content:
                     final_content = content
 
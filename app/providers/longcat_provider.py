@@ -5,7 +5,7 @@
 LongCat 提供商适配器
 """
 
-import json
+import orjson
 import time
 import httpx
 import random
@@ -15,11 +15,16 @@ from typing import Dict, List, Any, Optional, AsyncGenerator, Union
 from app.providers.base import BaseProvider, ProviderConfig
 from app.models.schemas import OpenAIRequest, Message
 from app.utils.logger import get_logger
+from app.utils.http_client import get_http_client, read_capped
+from app.utils.sse import DeltaCoalescer, IDLE_TICK, iter_sse_events, iter_with_deadline
 from app.utils.user_agent import get_dynamic_headers
 from app.core.config import settings
 
 logger = get_logger()
 
+# 创建会话的请求体固定不变，模块加载时序列化一次
+_CREATE_SESSION_BODY = orjson.dumps({"model": "", "agentId": ""})
+
 
 class LongCatProvider(BaseProvider):
     """LongCat 提供商"""
@@ -79,23 +84,22 @@ class LongCatProvider(BaseProvider):
     async def create_session(self, token: str, user_agent: str) -> str:
         """创建会话并返回 conversation_id"""
         headers = self.create_headers_with_auth(token, user_agent)
-        data = {"model": "", "agentId": ""}
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                self.session_create_url,
-                headers=headers,
-                json=data
-            )
+        client = get_http_client()
+        response = await client.post(
+            self.session_create_url,
+            headers=headers,
+            content=_CREATE_SESSION_BODY
+        )
 
-            if response.status_code != 200:
-                raise Exception(f"会话创建失败: {response.status_code}")
+        if response.status_code != 200:
+            raise Exception(f"会话创建失败: {response.status_code}")
 
-            response_data = response.json()
-            if response_data.get("code") != 0:
-                raise Exception(f"会话创建错误: {response_data.get('message')}")
+        response_data = orjson.loads(response.content)
+        if response_data.get("code") != 0:
+            raise Exception(f"会话创建错误: {response_data.get('message')}")
 
-            return response_data["data"]["conversationId"]
+        return response_data["data"]["conversationId"]
 
     async def delete_session(self, conversation_id: str, token: str, user_agent: str) -> None:
         """删除会话"""
@@ -106,14 +110,14 @@ class LongCatProvider(BaseProvider):
                 f"{self.base_url}/c/{conversation_id}"
             )
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                url = f"{self.session_delete_url}?conversationId={conversation_id}"
-                response = await client.get(url, headers=headers)
+            client = get_http_client()
+            url = f"{self.session_delete_url}?conversationId={conversation_id}"
+            response = await client.get(url, headers=headers)
 
-                if response.status_code == 200:
-                    self.logger.debug(f"成功删除会话 {conversation_id}")
-                else:
-                    self.logger.warning(f"删除会话失败: {response.status_code}")
+            if response.status_code == 200:
+                self.logger.debug("成功删除会话 {}", conversation_id)
+            else:
+                self.logger.warning(f"删除会话失败: {response.status_code}")
         except Exception as e:
             self.logger.error(f"删除会话出错: {e}")
 
@@ -183,7 +187,7 @@ class LongCatProvider(BaseProvider):
         self,
         request: OpenAIRequest,
         **kwargs
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """聊天完成接口"""
         self.log_request(request)
 
@@ -191,38 +195,86 @@ class LongCatProvider(BaseProvider):
             # 转换请求
             transformed = await self.transform_request(request)
 
-            # 发送请求
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    transformed["url"],
-                    headers=transformed["headers"],
-                    json=transformed["payload"]
-                )
+            if request.stream:
+                # 流式请求在生成器内部发起上游请求，连接的生命周期完全由生成器管理，
+                # 生成器未被迭代就被丢弃（如客户端提前断开）时也不会占用连接池
+                return self._stream_chat_completion(request, transformed)
 
-                if not response.is_success:
-                    error_msg = f"LongCat API 错误: {response.status_code}"
-                    try:
-                        error_detail = await response.atext()
-                        self.logger.error(f"❌ API 错误详情: {error_detail}")
-                    except:
-                        pass
-                    self.log_response(False, error_msg)
-                    return self.handle_error(Exception(error_msg))
+            response = await self._send_upstream_request(transformed)
+            if not response.is_success:
+                error_msg = await self._read_upstream_error(response)
+                return self.handle_error(Exception(error_msg))
 
-                # 转换响应
-                return await self.transform_response(response, request, transformed)
+            # 转换响应
+            return await self.transform_response(response, request, transformed)
 
         except Exception as e:
             self.logger.error(f"❌ LongCat 请求处理异常: {e}")
             self.log_response(False, str(e))
             return self.handle_error(e, "请求处理")
+
+    async def _send_upstream_request(self, transformed: Dict[str, Any]) -> httpx.Response:
+        """发送上游请求：以流式方式接收响应体，收到首个事件即可开始转发，由调用方负责关闭"""
+        client = get_http_client()
+        upstream_request = client.build_request(
+            "POST",
+            transformed["url"],
+            headers=transformed["headers"],
+            content=orjson.dumps(transformed["payload"])
+        )
+        return await client.send(upstream_request, stream=True)
+
+    async def _read_upstream_error(self, response: httpx.Response) -> str:
+        """记录上游错误响应并关闭连接，返回错误信息"""
+        error_msg = f"LongCat API 错误: {response.status_code}"
+        try:
+            error_detail = (await read_capped(response)).decode("utf-8", errors="ignore")
+            self.logger.error("❌ API 错误详情: {}", error_detail)
+        except:
+            pass
+        finally:
+            await response.aclose()
+        self.log_response(False, error_msg)
+        return error_msg
+
+    async def _stream_chat_completion(
+        self,
+        request: OpenAIRequest,
+        transformed: Dict[str, Any]
+    ) -> AsyncGenerator[bytes, None]:
+        """发起流式请求并转发响应，上游连接在生成器结束或关闭时释放"""
+        try:
+            response = await self._send_upstream_request(transformed)
+        except Exception as e:
+            self.logger.error(f"❌ LongCat 请求处理异常: {e}")
+            self.log_response(False, str(e))
+            yield await self.format_sse_chunk(self.handle_error(e, "请求处理"))
+            yield await self.format_sse_done()
+            return
+
+        try:
+            if not response.is_success:
+                error_msg = await self._read_upstream_error(response)
+                yield await self.format_sse_chunk(self.handle_error(Exception(error_msg)))
+                yield await self.format_sse_done()
+                return
+
+            chunks = await self.transform_response(response, request, transformed)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+        finally:
+            # 处理函数未开始迭代或转换失败时由这里关闭连接，重复关闭无副作用
+            await response.aclose()
     
     async def transform_response(
         self,
         response: httpx.Response,
         request: OpenAIRequest,
         transformed: Dict[str, Any]
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """转换LongCat响应为OpenAI格式"""
         chat_id = self.create_chat_id()
         model = transformed["model"]
@@ -247,26 +299,42 @@ class LongCatProvider(BaseProvider):
         conversation_id: str,
         passport_token: str,
         user_agent: str
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
         """处理LongCat流式响应"""
         session_deleted = False
+        stream_finished = False
+
+        # 合并短时间内到达的增量，减少逐 token 的帧编码与 flush
+        coalescer = DeltaCoalescer()
+
+        async def flush_pending() -> Optional[bytes]:
+            merged = coalescer.flush()
+            if not merged:
+                return None
+            field, text = merged
+            return await self.format_sse_chunk(self.create_openai_chunk(chat_id, model, {field: text}))
 
+        upstream_events = iter_with_deadline(iter_sse_events(response), coalescer.timeout)
         try:
             # 发送初始角色块
             yield await self.format_sse_chunk(
                 self.create_openai_chunk(chat_id, model, {"role": "assistant"})
             )
 
-            stream_finished = False
+            async for event in upstream_events:
+                if event is IDLE_TICK:
+                    pending_frame = await flush_pending()
+                    if pending_frame:
+                        yield pending_frame
+                    continue
 
-            async for line in response.aiter_lines():
-                line = line.strip()
+                data, frame = event
 
                 # 首先检查是否是错误响应（JSON格式但不是SSE格式）
-                if not line.startswith('data:'):
+                if data is None:
                     # 尝试解析为JSON错误响应
                     try:
-                        error_data = json.loads(line)
+                        error_data = orjson.loads(frame)
                         if isinstance(error_data, dict) and 'code' in error_data and 'message' in error_data:
                             # 这是一个错误响应
                             self.logger.error(f"❌ LongCat API 返回错误: {error_data}")
@@ -277,7 +345,10 @@ class LongCatProvider(BaseProvider):
                             error_exception = Exception(f"LongCat API 错误 ({error_code}): {error_message}")
                             error_response = self.handle_error(error_exception, "API响应")
 
-                            # 发送错误响应块
+                            # 发送错误响应块（先送出已合并的内容）
+                            pending_frame = await flush_pending()
+                            if pending_frame:
+                                yield pending_frame
                             yield await self.format_sse_chunk(error_response)
                             yield await self.format_sse_done()
 
@@ -286,15 +357,17 @@ class LongCatProvider(BaseProvider):
                                 self.schedule_session_deletion(conversation_id, passport_token, user_agent)
                                 session_deleted = True
                             return
-                    except json.JSONDecodeError:
+                    except orjson.JSONDecodeError:
                         # 不是JSON，跳过这行
                         continue
 
                     # 如果不是错误响应，跳过
                     continue
 
-                data_str = line[5:].strip()
-                if data_str == '[DONE]':
+                if data == b'[DONE]':
+                    pending_frame = await flush_pending()
+                    if pending_frame:
+                        yield pending_frame
                     # 如果还没有发送完成块，发送一个
                     if not stream_finished:
                         yield await self.format_sse_chunk(
@@ -309,7 +382,7 @@ class LongCatProvider(BaseProvider):
                     break
 
                 try:
-                    longcat_data = json.loads(data_str)
+                    longcat_data = orjson.loads(data)
 
                     # 获取 delta 内容
                     choices = longcat_data.get("choices", [])
@@ -322,16 +395,17 @@ class LongCatProvider(BaseProvider):
 
                     # 只有当内容不为空时才发送内容块
                     if content is not None and content != "":
-                        openai_chunk = self.create_openai_chunk(
-                            chat_id,
-                            model,
-                            {"content": content}
-                        )
-                        yield await self.format_sse_chunk(openai_chunk)
+                        for field, text in coalescer.add("content", content):
+                            yield await self.format_sse_chunk(
+                                self.create_openai_chunk(chat_id, model, {field: text})
+                            )
 
                     # 检查是否为流的结束
                     # LongCat 使用 lastOne=true 来标识最后一个块
                     if longcat_data.get("lastOne") and not stream_finished:
+                        pending_frame = await flush_pending()
+                        if pending_frame:
+                            yield pending_frame
                         yield await self.format_sse_chunk(
                             self.create_openai_chunk(chat_id, model, {}, "stop")
                         )
@@ -346,6 +420,9 @@ class LongCatProvider(BaseProvider):
 
                     # 备用检查：如果有 finishReason 但没有 lastOne，也可能是结束
                     elif finish_reason == "stop" and longcat_data.get("contentStatus") == "FINISHED" and not stream_finished:
+                        pending_frame = await flush_pending()
+                        if pending_frame:
+                            yield pending_frame
                         yield await self.format_sse_chunk(
                             self.create_openai_chunk(chat_id, model, {}, "stop")
                         )
@@ -358,22 +435,33 @@ class LongCatProvider(BaseProvider):
                             session_deleted = True
                         break
 
-                except json.JSONDecodeError as e:
+                except orjson.JSONDecodeError as e:
                     self.logger.error(f"❌ 解析LongCat流数据错误: {e}")
                     continue
                 except Exception as e:
                     self.logger.error(f"❌ 处理LongCat流数据错误: {e}")
                     continue
 
+            # 流结束时送出剩余的合并内容（上游未发送结束标记就关闭的情况）
+            pending_frame = await flush_pending()
+            if pending_frame:
+                yield pending_frame
+
         except Exception as e:
             self.logger.error(f"❌ LongCat流处理错误: {e}")
             # 发送错误结束块（只有在还没有结束的情况下）
             if not stream_finished:
+                pending_frame = await flush_pending()
+                if pending_frame:
+                    yield pending_frame
                 yield await self.format_sse_chunk(
                     self.create_openai_chunk(chat_id, model, {}, "stop")
                 )
                 yield await self.format_sse_done()
         finally:
+            # 提前结束（如收到 lastOne 或客户端断开）时立即关闭上游连接，不再接收后续数据
+            await upstream_events.aclose()
+            await response.aclose()
             # 确保会话被清理
             if not session_deleted:
                 self.schedule_session_deletion(conversation_id, passport_token, user_agent)
@@ -388,7 +476,8 @@ class LongCatProvider(BaseProvider):
         user_agent: str
     ) -> Dict[str, Any]:
         """处理LongCat非流式响应"""
-        full_content = ""
+        # 增量片段收集到列表中，结束时一次拼接，避免逐个字符串相加反复复制
+        content_parts: List[str] = []
         usage_info = {
             "prompt_tokens": 0,
             "completion_tokens": 0,
@@ -396,12 +485,11 @@ class LongCatProvider(BaseProvider):
         }
 
         try:
-            async for line in response.aiter_lines():
-                line = line.strip()
-                if not line.startswith('data:'):
+            async for data, frame in iter_sse_events(response):
+                if data is None:
                     # 检查是否是错误响应
                     try:
-                        error_data = json.loads(line)
+                        error_data = orjson.loads(frame)
                         if isinstance(error_data, dict) and 'code' in error_data and 'message' in error_data:
                             # 这是一个错误响应
                             self.logger.error(f"❌ LongCat API 返回错误: {error_data}")
@@ -415,17 +503,16 @@ class LongCatProvider(BaseProvider):
                             self.schedule_session_deletion(conversation_id, passport_token, user_agent)
 
                             return self.handle_error(error_exception, "API响应")
-                    except json.JSONDecodeError:
+                    except orjson.JSONDecodeError:
                         # 不是JSON，跳过这行
                         pass
                     continue
 
-                data_str = line[5:].strip()
-                if data_str == '[DONE]':
+                if data == b'[DONE]':
                     break
 
                 try:
-                    chunk = json.loads(data_str)
+                    chunk = orjson.loads(data)
 
                     # 提取内容 - 只有当内容不为空时才添加
                     choices = chunk.get("choices", [])
@@ -433,7 +520,7 @@ class LongCatProvider(BaseProvider):
                         delta = choices[0].get("delta", {})
                         content = delta.get("content")
                         if content is not None and content != "":
-                            full_content += content
+                            content_parts.append(content)
 
                     # 提取使用信息（通常在最后的块中）
                     if chunk.get("tokenInfo"):
@@ -448,19 +535,20 @@ class LongCatProvider(BaseProvider):
                     if chunk.get("lastOne"):
                         break
 
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     continue
 
         except Exception as e:
             self.logger.error(f"❌ 处理LongCat非流式响应错误: {e}")
-            full_content = "处理响应时发生错误"
+            content_parts = ["处理响应时发生错误"]
         finally:
+            await response.aclose()
             # 清理会话
             self.schedule_session_deletion(conversation_id, passport_token, user_agent)
 
         return self.create_openai_response(
             chat_id,
             model,
-            full_content.strip(),
+            "".join(content_parts).strip(),
             usage_info
         )
@@ -13,11 +13,14 @@ from app.providers.zai_provider import ZAIProvider
 from app.providers.k2think_provider import K2ThinkProvider
 from app.providers.longcat_provider import LongCatProvider
 from app.models.schemas import OpenAIRequest
-from app.core.config import settings
+from app.core.config import PROVIDER_MODEL_MAPPING
 from app.utils.logger import get_logger
 
 logger = get_logger()
 
+# 模型列表缓存时长（秒），模型 ID 固定，只有 created 字段随时间刷新
+MODELS_LIST_TTL = 60
+
 
 class ProviderFactory:
     """提供商工厂"""
@@ -65,19 +68,18 @@ class ProviderFactory:
             self.initialize()
         
         # 首先尝试从配置的映射中获取
-        provider_mapping = settings.provider_model_mapping
-        provider_name = provider_mapping.get(model)
+        provider_name = PROVIDER_MODEL_MAPPING.get(model)
         
         if provider_name:
             provider = provider_registry.get_provider_by_name(provider_name)
             if provider:
-                logger.debug(f"🎯 模型 {model} 映射到提供商 {provider_name}")
+                logger.debug("🎯 模型 {} 映射到提供商 {}", model, provider_name)
                 return provider
         
         # 尝试从注册表中直接获取
         provider = provider_registry.get_provider(model)
         if provider:
-            logger.debug(f"🎯 模型 {model} 找到提供商 {provider.name}")
+            logger.debug("🎯 模型 {} 找到提供商 {}", model, provider.name)
             return provider
         
         # 使用默认提供商
@@ -117,14 +119,16 @@ class ProviderRouter:
     
     def __init__(self):
         self.factory = ProviderFactory()
+        self._models_cache: Optional[Dict[str, Any]] = None
+        self._models_cached_at = 0.0
     
     async def route_request(
         self, 
         request: OpenAIRequest,
         **kwargs
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """路由请求到合适的提供商"""
-        logger.info(f"🚦 路由请求: 模型={request.model}, 流式={request.stream}")
+        logger.info("🚦 路由请求: 模型={}, 流式={}", request.model, request.stream)
         
         # 获取提供商
         provider = self.factory.get_provider_for_model(request.model)
@@ -139,12 +143,12 @@ class ProviderRouter:
                 }
             }
         
-        logger.info(f"✅ 使用提供商: {provider.name}")
+        logger.info("✅ 使用提供商: {}", provider.name)
         
         try:
             # 调用提供商处理请求
             result = await provider.chat_completion(request, **kwargs)
-            logger.info(f"🎉 请求处理完成: {provider.name}")
+            logger.info("🎉 请求处理完成: {}", provider.name)
             return result
             
         except Exception as e:
@@ -165,7 +169,12 @@ class ProviderRouter:
         return None
 
     def get_models_list(self) -> Dict[str, Any]:
-        """获取模型列表（OpenAI格式）"""
+        """获取模型列表（OpenAI格式），结果缓存 MODELS_LIST_TTL 秒，调用方不应修改返回值"""
+        # 缓存有效期用单调时钟判断，不受系统时间调整影响
+        now = time.monotonic()
+        if self._models_cache is not None and now - self._models_cached_at < MODELS_LIST_TTL:
+            return self._models_cache
+
         models = []
         current_time = int(time.time())
 
@@ -180,10 +189,12 @@ class ProviderRouter:
                     "owned_by": provider_name
                 })
 
-        return {
+        self._models_cache = {
             "object": "list",
             "data": models
         }
+        self._models_cached_at = now
+        return self._models_cache
 
 
 # 全局路由器实例
@@ -5,10 +5,10 @@
 Z.AI 提供商适配器
 """
 
-import json
 import time
 import uuid
 import httpx
+import orjson
 import hmac
 import hashlib
 import base64
@@ -17,16 +17,20 @@ from urllib.parse import urlencode
 import os
 import uuid
 import random
-from datetime import datetime
-from typing import Dict, List, Any, Optional, AsyncGenerator, Union
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Deque, List, Any, Optional, AsyncGenerator, Tuple, Union
 from app.utils.user_agent import get_random_user_agent
-from app.utils.fe_version import get_latest_fe_version
+from app.utils.fe_version import get_latest_fe_version, get_latest_fe_version_async
 from app.utils.signature import generate_signature
 from app.providers.base import BaseProvider, ProviderConfig
 from app.models.schemas import OpenAIRequest, Message
 from app.core.config import settings
 from app.utils.logger import get_logger
 from app.utils.token_pool import get_token_pool
+from app.utils.http_client import get_http_client, read_capped
+from app.utils.sse import DeltaCoalescer, IDLE_TICK, iter_sse_events, iter_with_deadline, prefetch
 from app.utils.tool_call_handler import (
     process_messages_with_tools,
     parse_and_extract_tool_calls,
@@ -34,52 +38,142 @@ from app.utils.tool_call_handler import (
 
 logger = get_logger()
 
+# SSE 帧的固定字节片段，流式输出时直接拼接
+_SSE_DATA_PREFIX = b"data: "
+_SSE_FRAME_SUFFIX = b"\n\n"
+_SSE_DONE = b"data: [DONE]\n\n"
+
+# 文本增量帧模板中的占位符，用于切出帧的固定前后缀
+_DELTA_PLACEHOLDER = "\x00delta\x00"
+_DELTA_PLACEHOLDER_JSON = orjson.dumps(_DELTA_PLACEHOLDER)
+
+# 思考内容首块的包裹头结束标记：<details ...><summary>...</summary>\n>
+_THINKING_HEADER_END = "</summary>\n>"
+_THINKING_HEADER_END_LEN = len(_THINKING_HEADER_END)
+
+
+def _clean_thinking_delta(delta_content: str) -> str:
+    """去除思考内容首块中的 <details><summary>... 包裹头"""
+    if not delta_content.startswith("<details"):
+        return delta_content
+    idx = delta_content.rfind(_THINKING_HEADER_END)
+    if idx == -1:
+        return delta_content
+    return delta_content[idx + _THINKING_HEADER_END_LEN:].strip()
+
+
+# 思考块结束标记，edit_content 中该标记之后为答案内容
+_THINKING_END = "</details>\n"
+_THINKING_END_LEN = len(_THINKING_END)
+
+
+def _answer_after_thinking(edit_content: str) -> Optional[str]:
+    """提取 edit_content 中思考块结束标记之后的答案部分，不含标记时返回 None"""
+    if not edit_content:
+        return None
+    idx = edit_content.rfind(_THINKING_END)
+    if idx == -1:
+        return None
+    return edit_content[idx + _THINKING_END_LEN:]
+
+
+# User-Agent 中的浏览器主版本号，如 Chrome/139.0.0.0、Edg/139.0.0.0、Firefox/137.0
+_UA_BROWSER_VERSION_PATTERN = re.compile(r"(Chrome|Edg|Firefox)/(\d+)")
+
+# 上游请求头中与请求无关的部分，按请求只合并动态字段
+_BROWSER_STATIC_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json, text/event-stream",
+    "Connection": "keep-alive",
+    "Cache-Control": "no-cache",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Origin": "https://chat.z.ai",
+}
+_SEC_CH_STATIC_HEADERS = {
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+}
+_CHAT_STATIC_HEADERS = {
+    "Content-Type": "application/json",
+}
+_UPLOAD_STATIC_HEADERS = {
+    "Accept": "*/*",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Origin": "https://chat.z.ai",
+    "Pragma": "no-cache",
+    "Sec-Ch-Ua": '"Microsoft Edge";v="141", "Not?A_Brand";v="8", "Chromium";v="141"',
+    "Sec-Ch-Ua-Mobile": "?0",
+    "Sec-Ch-Ua-Platform": '"Windows"',
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-origin",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0",
+}
+
+
+# 上游 variables 中的时间变量，按秒缓存：(秒级时间戳, 变量字典)
+_datetime_vars_cache: Tuple[int, Dict[str, str]] = (0, {})
+
+
+def _current_datetime_vars() -> Dict[str, str]:
+    """返回当前时间相关的模板变量，同一秒内的请求复用同一份结果"""
+    global _datetime_vars_cache
+    now = int(time.time())
+    if now != _datetime_vars_cache[0]:
+        local_now = time.localtime(now)
+        _datetime_vars_cache = (now, {
+            "{{CURRENT_DATETIME}}": time.strftime("%Y-%m-%d %H:%M:%S", local_now),
+            "{{CURRENT_DATE}}": time.strftime("%Y-%m-%d", local_now),
+            "{{CURRENT_TIME}}": time.strftime("%H:%M:%S", local_now),
+            "{{CURRENT_WEEKDAY}}": time.strftime("%A", local_now),
+        })
+    return _datetime_vars_cache[1]
+
 def generate_uuid() -> str:
     """生成UUID v4"""
     return str(uuid.uuid4())
 
-def get_zai_dynamic_headers(chat_id: str = "") -> Dict[str, str]:
-    """生成 Z.AI 特定的动态浏览器 headers"""
+@lru_cache(maxsize=256)
+def _sec_ch_ua_for(user_agent: str) -> Optional[str]:
+    """根据 User-Agent 生成 sec-ch-ua（Firefox 不发送该头）
+
+    UA 来自有限的候选池，解析结果按 UA 缓存，每个 UA 只做一次正则匹配。
+    """
+    versions = dict(_UA_BROWSER_VERSION_PATTERN.findall(user_agent))
+    chrome_version = versions.get("Chrome", "139")
+
+    if "Edg" in versions:
+        return f'"Microsoft Edge";v="{versions["Edg"]}", "Chromium";v="{chrome_version}", "Not_A Brand";v="24"'
+    if "Firefox" in versions:
+        return None
+    return f'"Not_A Brand";v="8", "Chromium";v="{chrome_version}", "Google Chrome";v="{chrome_version}"'
+
+
+def get_zai_dynamic_headers(chat_id: str = "", fe_version: Optional[str] = None) -> Dict[str, str]:
+    """生成 Z.AI 特定的动态浏览器 headers
+
+    异步调用方应先 await get_latest_fe_version_async() 并传入 fe_version，
+    未传入时走同步获取（缓存失效时会阻塞）。
+    """
     browser_choices = ["chrome", "chrome", "chrome", "edge", "edge", "firefox", "safari"]
     browser_type = random.choice(browser_choices)
     user_agent = get_random_user_agent(browser_type)
-    fe_version = get_latest_fe_version()
-
-    chrome_version = "139"
-    edge_version = "139"
-
-    if "Chrome/" in user_agent:
-        try:
-            chrome_version = user_agent.split("Chrome/")[1].split(".")[0]
-        except:
-            pass
+    if fe_version is None:
+        fe_version = get_latest_fe_version()
 
-    if "Edg/" in user_agent:
-        try:
-            edge_version = user_agent.split("Edg/")[1].split(".")[0]
-            sec_ch_ua = f'"Microsoft Edge";v="{edge_version}", "Chromium";v="{chrome_version}", "Not_A Brand";v="24"'
-        except:
-            sec_ch_ua = f'"Not_A Brand";v="8", "Chromium";v="{chrome_version}", "Google Chrome";v="{chrome_version}"'
-    elif "Firefox/" in user_agent:
-        sec_ch_ua = None
-    else:
-        sec_ch_ua = f'"Not_A Brand";v="8", "Chromium";v="{chrome_version}", "Google Chrome";v="{chrome_version}"'
+    sec_ch_ua = _sec_ch_ua_for(user_agent)
 
     headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json, text/event-stream",
-        "Connection": "keep-alive",
-        "Cache-Control": "no-cache",
+        **_BROWSER_STATIC_HEADERS,
         "User-Agent": user_agent,
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
         "X-FE-Version": fe_version,
-        "Origin": "https://chat.z.ai",
     }
 
     if sec_ch_ua:
+        headers.update(_SEC_CH_STATIC_HEADERS)
         headers["sec-ch-ua"] = sec_ch_ua
-        headers["sec-ch-ua-mobile"] = "?0"
-        headers["sec-ch-ua-platform"] = '"Windows"'
 
     if chat_id:
         headers["Referer"] = f"https://chat.z.ai/c/{chat_id}"
@@ -105,13 +199,17 @@ def _decode_jwt_payload(token: str) -> Dict[str, Any]:
         if len(parts) < 2:
             return {}
         payload_raw = _urlsafe_b64decode(parts[1])
-        return json.loads(payload_raw.decode("utf-8", errors="ignore"))
+        return orjson.loads(payload_raw.decode("utf-8", errors="ignore"))
     except Exception:
         return {}
 
 
+@lru_cache(maxsize=1024)
 def _extract_user_id_from_token(token: str) -> str:
-    """Extract user_id from a JWT's payload. Fallback to 'guest'."""
+    """Extract user_id from a JWT's payload. Fallback to 'guest'.
+
+    令牌在有效期内会被反复使用，按令牌缓存解析结果，避免每个请求重复 base64 + JSON 解码。
+    """
     payload = _decode_jwt_payload(token) if token else {}
     for key in ("id", "user_id", "uid", "sub"):
         val = payload.get(key)
@@ -149,6 +247,11 @@ class ZAIProvider(BaseProvider):
             settings.GLM46_SEARCH_MODEL: "GLM-4-6-API-V1",  # GLM-4.6-Search
             settings.GLM46_ADVANCED_SEARCH_MODEL: "GLM-4-6-API-V1",  # GLM-4.6-advanced-search
         }
+
+        # 匿名模式下后台预取的访客令牌：(令牌, 获取时间)
+        self._guest_tokens: Deque[Tuple[str, float]] = deque()
+        self._guest_token_wanted: Optional[asyncio.Event] = None
+        self._guest_token_task: Optional[asyncio.Task] = None
     
     def get_supported_models(self) -> List[str]:
         """获取支持的模型列表"""
@@ -183,87 +286,154 @@ class ZAIProvider(BaseProvider):
 
         return None
 
-    async def get_token(self) -> str:
-        """获取认证令牌"""
-        # 如果启用匿名模式，只尝试获取访客令牌
-        if settings.ANONYMOUS_MODE:
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    headers = get_zai_dynamic_headers()
-                    self.logger.debug(f"尝试获取访客令牌 (第{retry_count + 1}次): {self.auth_url}")
-                    self.logger.debug(f"请求头: {headers}")
+    async def _fetch_guest_token(self) -> str:
+        """从 Z.AI 获取访客令牌（失败时最多重试3次）"""
+        max_retries = 3
+        retry_count = 0
+        
+        while retry_count < max_retries:
+            try:
+                headers = get_zai_dynamic_headers(fe_version=await get_latest_fe_version_async())
+                self.logger.debug("尝试获取访客令牌 (第{}次): {}", retry_count + 1, self.auth_url)
+                self.logger.debug("请求头: {}", headers)
 
-                    # Get proxy configuration
-                    proxies = self._get_proxy_config()
+                # Get proxy configuration
+                proxies = self._get_proxy_config()
 
-                    async with httpx.AsyncClient(timeout=30.0, follow_redirects=True, proxy=proxies) as client:
-                        response = await client.get(self.auth_url, headers=headers)
-                        
-                        self.logger.debug(f"响应状态码: {response.status_code}")
-                        self.logger.debug(f"响应头: {dict(response.headers)}")
-                        
-                        if response.status_code == 200:
-                            data = response.json()
-                            self.logger.debug(f"响应数据: {data}")
-                            
-                            token = data.get("token", "")
-                            if token:
-                                # 判断令牌类型（通过检查邮箱或user_id）
-                                email = data.get("email", "")
-                                is_guest = "@guest.com" in email or "Guest-" in email
-                                token_type = "匿名用户" if is_guest else "认证用户"
-                                self.logger.info(f"✅ 获取令牌成功 ({token_type}): {token[:20]}...")
-                                return token
-                            else:
-                                self.logger.warning(f"响应中未找到token字段: {data}")
-                        elif response.status_code == 405:
-                            # WAF拦截
-                            self.logger.error(f"🚫 请求被WAF拦截 (状态码405),请求头可能被识别为异常,请稍后重试...")
-                            break
-                        else:
-                            self.logger.warning(f"HTTP请求失败,状态码: {response.status_code}")
-                            try:
-                                error_data = response.json()
-                                self.logger.warning(f"错误响应: {error_data}")
-                            except:
-                                self.logger.warning(f"错误响应文本: {response.text}")
-                                
-                except httpx.TimeoutException as e:
-                    self.logger.warning(f"请求超时 (第{retry_count + 1}次): {e}")
-                except httpx.ConnectError as e:
-                    self.logger.warning(f"连接错误 (第{retry_count + 1}次): {e}")
-                except httpx.HTTPStatusError as e:
-                    self.logger.warning(f"HTTP状态错误 (第{retry_count + 1}次): {e}")
-                except json.JSONDecodeError as e:
-                    self.logger.warning(f"JSON解析错误 (第{retry_count + 1}次): {e}")
-                except Exception as e:
-                    self.logger.warning(f"异步获取访客令牌失败 (第{retry_count + 1}次): {e}")
-                    import traceback
-                    self.logger.debug(f"错误堆栈: {traceback.format_exc()}")
+                client = get_http_client(proxies)
+                response = await client.get(
+                    self.auth_url, headers=headers, timeout=30.0, follow_redirects=True
+                )
                 
-                retry_count += 1
-                if retry_count < max_retries:
-                    self.logger.info(f"等待2秒后重试...")
-                    await asyncio.sleep(2)
+                self.logger.debug("响应状态码: {}", response.status_code)
+                self.logger.opt(lazy=True).debug("响应头: {}", lambda: dict(response.headers))
+                
+                if response.status_code == 200:
+                    data = orjson.loads(response.content)
+                    self.logger.debug("响应数据: {}", data)
+                    
+                    token = data.get("token", "")
+                    if token:
+                        # 判断令牌类型（通过检查邮箱或user_id）
+                        email = data.get("email", "")
+                        is_guest = "@guest.com" in email or "Guest-" in email
+                        token_type = "匿名用户" if is_guest else "认证用户"
+                        self.logger.info(f"✅ 获取令牌成功 ({token_type}): {token[:20]}...")
+                        return token
+                    else:
+                        self.logger.warning(f"响应中未找到token字段: {data}")
+                elif response.status_code == 405:
+                    # WAF拦截
+                    self.logger.error(f"🚫 请求被WAF拦截 (状态码405),请求头可能被识别为异常,请稍后重试...")
+                    break
+                else:
+                    self.logger.warning(f"HTTP请求失败,状态码: {response.status_code}")
+                    try:
+                        error_data = orjson.loads(response.content)
+                        self.logger.warning(f"错误响应: {error_data}")
+                    except:
+                        self.logger.warning(f"错误响应文本: {response.text}")
+                        
+            except httpx.TimeoutException as e:
+                self.logger.warning(f"请求超时 (第{retry_count + 1}次): {e}")
+            except httpx.ConnectError as e:
+                self.logger.warning(f"连接错误 (第{retry_count + 1}次): {e}")
+            except httpx.HTTPStatusError as e:
+                self.logger.warning(f"HTTP状态错误 (第{retry_count + 1}次): {e}")
+            except orjson.JSONDecodeError as e:
+                self.logger.warning(f"JSON解析错误 (第{retry_count + 1}次): {e}")
+            except Exception as e:
+                self.logger.warning(f"异步获取访客令牌失败 (第{retry_count + 1}次): {e}")
+                # 堆栈只在调试级别启用时由 loguru 格式化
+                self.logger.opt(exception=True).debug("错误堆栈")
+            
+            retry_count += 1
+            if retry_count < max_retries:
+                self.logger.info(f"等待2秒后重试...")
+                await asyncio.sleep(2)
 
-            # 匿名模式下，如果获取访客令牌失败，直接返回空
-            self.logger.error("❌ 匿名模式下获取访客令牌失败，已重试3次")
-            return ""
+        # 匿名模式下，如果获取访客令牌失败，直接返回空
+        self.logger.error("❌ 匿名模式下获取访客令牌失败，已重试3次")
+        return ""
+
+    def start_guest_token_prefetch(self) -> None:
+        """启动访客令牌后台预取任务（匿名模式下在应用启动时调用）"""
+        if settings.GUEST_TOKEN_PREFETCH <= 0 or self._guest_token_task is not None:
+            return
+        self._guest_token_wanted = asyncio.Event()
+        self._guest_token_task = asyncio.create_task(self._prefetch_guest_tokens())
+        self.logger.info("🎫 访客令牌预取已启动，预取数量: {}", settings.GUEST_TOKEN_PREFETCH)
+
+    async def stop_guest_token_prefetch(self) -> None:
+        """停止访客令牌后台预取任务"""
+        task = self._guest_token_task
+        if task is None:
+            return
+        self._guest_token_task = None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        self._guest_tokens.clear()
+
+    def _prune_guest_tokens(self) -> None:
+        """丢弃超过有效期的预取令牌"""
+        expire_before = time.monotonic() - settings.GUEST_TOKEN_TTL
+        while self._guest_tokens and self._guest_tokens[0][1] < expire_before:
+            self._guest_tokens.popleft()
+
+    def _pop_guest_token(self) -> str:
+        """取出一个预取的访客令牌，没有可用令牌时返回空字符串"""
+        self._prune_guest_tokens()
+        token = self._guest_tokens.popleft()[0] if self._guest_tokens else ""
+        if self._guest_token_wanted is not None:
+            self._guest_token_wanted.set()
+        return token
+
+    async def _prefetch_guest_tokens(self) -> None:
+        """后台保持预取令牌数量充足，已满时等待令牌被取用或过期"""
+        while True:
+            self._prune_guest_tokens()
+            if len(self._guest_tokens) >= settings.GUEST_TOKEN_PREFETCH:
+                oldest_expires_in = self._guest_tokens[0][1] + settings.GUEST_TOKEN_TTL - time.monotonic()
+                self._guest_token_wanted.clear()
+                wanted = asyncio.ensure_future(self._guest_token_wanted.wait())
+                try:
+                    await asyncio.wait((wanted,), timeout=max(oldest_expires_in, 0))
+                finally:
+                    wanted.cancel()
+                continue
+
+            token = await self._fetch_guest_token()
+            if token:
+                self._guest_tokens.append((token, time.monotonic()))
+            else:
+                # 获取失败时退避，避免持续请求上游
+                await asyncio.sleep(10)
+
+    async def get_token(self) -> str:
+        """获取认证令牌"""
+        # 如果启用匿名模式，只尝试获取访客令牌
+        if settings.ANONYMOUS_MODE:
+            # 优先使用后台预取的访客令牌，省去请求路径上的一次上游往返
+            token = self._pop_guest_token()
+            if token:
+                self.logger.debug("使用预取的访客令牌: {}...", token[:20])
+                return token
+            return await self._fetch_guest_token()
 
         # 非匿名模式：首先使用token池获取备份令牌
         token_pool = get_token_pool()
         if token_pool:
             token = token_pool.get_next_token()
             if token:
-                self.logger.debug(f"从token池获取令牌: {token[:20]}...")
+                self.logger.debug("从token池获取令牌: {}...", token[:20])
                 return token
 
         # 如果token池为空或没有可用token，使用配置的AUTH_TOKEN
         if settings.AUTH_TOKEN and settings.AUTH_TOKEN != "sk-your-api-key":
-            self.logger.debug(f"使用配置的AUTH_TOKEN")
+            self.logger.debug("使用配置的AUTH_TOKEN")
             return settings.AUTH_TOKEN
 
         self.logger.error("❌ 无法获取有效的认证令牌")
@@ -299,25 +469,13 @@ class ZAIProvider(BaseProvider):
             image_data = base64.b64decode(encoded)
             filename = str(uuid.uuid4())
 
-            self.logger.debug(f"📤 上传图片: {filename}, 大小: {len(image_data)} bytes")
+            self.logger.debug("📤 上传图片: {}, 大小: {} bytes", filename, len(image_data))
 
             # 构建上传请求
             upload_url = f"{self.base_url}/api/v1/files/"
             headers = {
-                "Accept": "*/*",
-                "Accept-Language": "zh-CN,zh;q=0.9",
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Origin": f"{self.base_url}",
-                "Pragma": "no-cache",
+                **_UPLOAD_STATIC_HEADERS,
                 "Referer": f"{self.base_url}/c/{chat_id}",
-                "Sec-Ch-Ua": '"Microsoft Edge";v="141", "Not?A_Brand";v="8", "Chromium";v="141"',
-                "Sec-Ch-Ua-Mobile": "?0",
-                "Sec-Ch-Ua-Platform": '"Windows"',
-                "Sec-Fetch-Dest": "empty",
-                "Sec-Fetch-Mode": "cors",
-                "Sec-Fetch-Site": "same-origin",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0",
                 "Authorization": f"Bearer {token}",
             }
 
@@ -325,51 +483,51 @@ class ZAIProvider(BaseProvider):
             proxies = self._get_proxy_config()
 
             # 使用 httpx 上传文件
-            async with httpx.AsyncClient(timeout=30.0, proxy=proxies) as client:
-                files = {
-                    "file": (filename, image_data, mime_type)
-                }
-                response = await client.post(upload_url, files=files, headers=headers)
+            client = get_http_client(proxies)
+            files = {
+                "file": (filename, image_data, mime_type)
+            }
+            response = await client.post(upload_url, files=files, headers=headers, timeout=30.0)
 
-                if response.status_code == 200:
-                    result = response.json()
-                    file_id = result.get("id")
-                    file_name = result.get("filename")
-                    file_size = len(image_data)
-
-                    self.logger.info(f"✅ 图片上传成功: {file_id}_{file_name}")
-
-                    # 返回符合 Z.AI 格式的文件信息
-                    current_timestamp = int(time.time())
-                    return {
-                        "type": "image",
-                        "file": {
-                            "id": file_id,
-                            "user_id": user_id,
-                            "hash": None,
-                            "filename": file_name,
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                file_id = result.get("id")
+                file_name = result.get("filename")
+                file_size = len(image_data)
+
+                self.logger.info(f"✅ 图片上传成功: {file_id}_{file_name}")
+
+                # 返回符合 Z.AI 格式的文件信息
+                current_timestamp = int(time.time())
+                return {
+                    "type": "image",
+                    "file": {
+                        "id": file_id,
+                        "user_id": user_id,
+                        "hash": None,
+                        "filename": file_name,
+                        "data": {},
+                        "meta": {
+                            "name": file_name,
+                            "content_type": mime_type,
+                            "size": file_size,
                             "data": {},
-                            "meta": {
-                                "name": file_name,
-                                "content_type": mime_type,
-                                "size": file_size,
-                                "data": {},
-                            },
-                            "created_at": current_timestamp,
-                            "updated_at": current_timestamp
                         },
-                        "id": file_id,
-                        "url": f"/api/v1/files/{file_id}/content",
-                        "name": file_name,
-                        "status": "uploaded",
-                        "size": file_size,
-                        "error": "",
-                        "itemId": str(uuid.uuid4()),
-                        "media": "image"
-                    }
-                else:
-                    self.logger.error(f"❌ 图片上传失败: {response.status_code} - {response.text}")
-                    return None
+                        "created_at": current_timestamp,
+                        "updated_at": current_timestamp
+                    },
+                    "id": file_id,
+                    "url": f"/api/v1/files/{file_id}/content",
+                    "name": file_name,
+                    "status": "uploaded",
+                    "size": file_size,
+                    "error": "",
+                    "itemId": str(uuid.uuid4()),
+                    "media": "image"
+                }
+            else:
+                self.logger.error(f"❌ 图片上传失败: {response.status_code} - {response.text}")
+                return None
 
         except Exception as e:
             self.logger.error(f"❌ 图片上传异常: {e}")
@@ -377,7 +535,7 @@ class ZAIProvider(BaseProvider):
 
     async def transform_request(self, request: OpenAIRequest) -> Dict[str, Any]:
         """转换OpenAI请求为Z.AI格式"""
-        self.logger.info(f"🔄 转换 OpenAI 请求到 Z.AI 格式: {request.model}")
+        self.logger.info("🔄 转换 OpenAI 请求到 Z.AI 格式: {}", request.model)
 
         # 获取认证令牌
         token = await self.get_token()
@@ -416,7 +574,7 @@ class ZAIProvider(BaseProvider):
                                 image_url = part.image_url['url']
 
                             if image_url:
-                                self.logger.debug(f"✅ 检测到图片: {image_url[:50]}...")
+                                self.logger.debug("✅ 检测到图片: {}...", image_url[:50])
 
                                 # 如果是 base64 编码的图片，上传并添加到 files 数组
                                 if image_url.startswith("data:") and not settings.ANONYMOUS_MODE:
@@ -435,7 +593,7 @@ class ZAIProvider(BaseProvider):
                                                 "url": image_ref
                                             }
                                         })
-                                        self.logger.debug(f"📎 图片引用: {image_ref}")
+                                        self.logger.debug("📎 图片引用: {}", image_ref)
                                     else:
                                         # 上传失败，添加错误提示
                                         self.logger.warning(f"⚠️ 图片上传失败")
@@ -455,7 +613,7 @@ class ZAIProvider(BaseProvider):
                         elif part.get('type') == 'image_url':
                             image_url = part.get('image_url', {}).get('url', '')
                             if image_url:
-                                self.logger.debug(f"✅ 检测到图片: {image_url[:50]}...")
+                                self.logger.debug("✅ 检测到图片: {}...", image_url[:50])
 
                                 # 如果是 base64 编码的图片，上传并添加到 files 数组
                                 if image_url.startswith("data:") and not settings.ANONYMOUS_MODE:
@@ -474,7 +632,7 @@ class ZAIProvider(BaseProvider):
                                                 "url": image_ref
                                             }
                                         })
-                                        self.logger.debug(f"📎 图片引用: {image_ref}")
+                                        self.logger.debug("📎 图片引用: {}", image_ref)
                                     else:
                                         # 上传失败，添加错误提示
                                         self.logger.warning(f"⚠️ 图片上传失败")
@@ -528,10 +686,11 @@ class ZAIProvider(BaseProvider):
                     last_user_text = " ".join([t for t in texts if t]).strip()
                     break
         requested_model = request.model
-        is_thinking = "-thinking" in requested_model.casefold()
-        is_search = "-search" in requested_model.casefold()
+        model_key = requested_model.casefold()
+        is_thinking = "-thinking" in model_key
+        is_search = "-search" in model_key
         is_advanced_search = requested_model == settings.GLM46_ADVANCED_SEARCH_MODEL
-        is_air = "-air" in requested_model.casefold()
+        is_air = "-air" in model_key
 
         # 获取上游模型ID
         upstream_model_id = self.model_mapping.get(requested_model, "0727-360B-API")
@@ -545,7 +704,7 @@ class ZAIProvider(BaseProvider):
                 tools=request.tools,
                 tool_choice=tool_choice
             )
-            self.logger.info(f"🔧 工具调用已通过提示词注入: {len(request.tools)} 个工具")
+            self.logger.info("🔧 工具调用已通过提示词注入: {} 个工具", len(request.tools))
 
         # 构建MCP服务器列表
         mcp_servers = []
@@ -609,10 +768,7 @@ class ZAIProvider(BaseProvider):
             "variables": {
                 "{{USER_NAME}}": "Guest",
                 "{{USER_LOCATION}}": "Unknown",
-                "{{CURRENT_DATETIME}}": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "{{CURRENT_DATE}}": datetime.now().strftime("%Y-%m-%d"),
-                "{{CURRENT_TIME}}": datetime.now().strftime("%H:%M:%S"),
-                "{{CURRENT_WEEKDAY}}": datetime.now().strftime("%A"),
+                **_current_datetime_vars(),
                 "{{CURRENT_TIMEZONE}}": "Asia/Shanghai",
                 "{{USER_LANGUAGE}}": "zh-CN",
             },
@@ -638,7 +794,7 @@ class ZAIProvider(BaseProvider):
         user_id = _extract_user_id_from_token(token)
         timestamp_ms = int(time.time() * 1000)
         request_id = generate_uuid()
-        fe_version = get_latest_fe_version()
+        fe_version = await get_latest_fe_version_async()
         try:
             signing_metadata = f"requestId,{request_id},timestamp,{timestamp_ms},user_id,{user_id}"
             prompt_for_signature = last_user_text or ""
@@ -648,15 +804,15 @@ class ZAIProvider(BaseProvider):
                 s=timestamp_ms,
             )
             signature = signature_result["signature"]
-            logger.debug(f"[Z.AI] 生成签名成功: {signature[:16]}... (user_id={user_id}, request_id={request_id})")
+            logger.debug("[Z.AI] 生成签名成功: {}... (user_id={}, request_id={})", signature[:16], user_id, request_id)
         except Exception as e:
             logger.error(f"[Z.AI] 签名生成失败: {e}")
             signature = ""
 
         # 构建请求头
         headers = {
+            **_CHAT_STATIC_HEADERS,
             "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
             "X-FE-Version": fe_version,
             "X-Signature": signature,
         }
@@ -675,8 +831,8 @@ class ZAIProvider(BaseProvider):
         signed_url = f"{self.config.api_endpoint}?{urlencode(query_params)}"
 
         # 记录请求详情用于调试
-        logger.debug(f"[Z.AI] 请求头: Authorization=Bearer *****, X-Signature={signature[:16] if signature else '(空)'}...")
-        logger.debug(f"[Z.AI] URL 参数: timestamp={timestamp_ms}, requestId={request_id}, user_id={user_id}")
+        logger.debug("[Z.AI] 请求头: Authorization=Bearer *****, X-Signature={}...", signature[:16] or "(空)")
+        logger.debug("[Z.AI] URL 参数: timestamp={}, requestId={}, user_id={}", timestamp_ms, request_id, user_id)
         
         # 存储当前token用于错误处理
         self._current_token = token
@@ -694,7 +850,7 @@ class ZAIProvider(BaseProvider):
         self,
         request: OpenAIRequest,
         **kwargs
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """聊天完成接口"""
         self.log_request(request)
 
@@ -711,19 +867,20 @@ class ZAIProvider(BaseProvider):
                 proxies = self._get_proxy_config()
 
                 # 非流式响应
-                async with httpx.AsyncClient(timeout=30.0, proxy=proxies) as client:
-                    response = await client.post(
-                        transformed["url"],
-                        headers=transformed["headers"],
-                        json=transformed["body"]
-                    )
+                client = get_http_client(proxies)
+                response = await client.post(
+                    transformed["url"],
+                    headers=transformed["headers"],
+                    content=orjson.dumps(transformed["body"]),
+                    timeout=30.0,
+                )
 
-                    if not response.is_success:
-                        error_msg = f"Z.AI API 错误: {response.status_code}"
-                        self.log_response(False, error_msg)
-                        return self.handle_error(Exception(error_msg))
+                if not response.is_success:
+                    error_msg = f"Z.AI API 错误: {response.status_code}"
+                    self.log_response(False, error_msg)
+                    return self.handle_error(Exception(error_msg))
 
-                    return await self.transform_response(response, request, transformed)
+                return await self.transform_response(response, request, transformed)
 
         except Exception as e:
             self.log_response(False, str(e))
@@ -734,70 +891,65 @@ class ZAIProvider(BaseProvider):
         self,
         request: OpenAIRequest,
         transformed: Dict[str, Any]
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
 
         current_token = transformed.get("token", "")
         try:
             # Get proxy configuration
             proxies = self._get_proxy_config()
 
-            async with httpx.AsyncClient(
+            client = get_http_client(proxies)
+            self.logger.info("🎯 发送请求到 Z.AI: {}", transformed["url"])
+            # self.logger.info(f"📦 请求体 model: {transformed['body']['model']}")
+            # self.logger.info(f"📦 请求体 messages: {json.dumps(transformed['body']['messages'], ensure_ascii=False)}")
+            async with client.stream(
+                "POST",
+                transformed["url"],
+                content=orjson.dumps(transformed["body"]),
+                headers=transformed["headers"],
                 timeout=60.0,
-                http2=True,
-                proxy=proxies,
-            ) as client:
-                self.logger.info(f"🎯 发送请求到 Z.AI: {transformed['url']}")
-                # self.logger.info(f"📦 请求体 model: {transformed['body']['model']}")
-                # self.logger.info(f"📦 请求体 messages: {json.dumps(transformed['body']['messages'], ensure_ascii=False)}")
-                async with client.stream(
-                    "POST",
-                    transformed["url"],
-                    json=transformed["body"],
-                    headers=transformed["headers"],
-                ) as response:
-                    if response.status_code != 200:
-                        self.logger.error(f"❌ 上游返回错误: {response.status_code}")
-                        error_text = await response.aread()
-                        error_msg = error_text.decode('utf-8', errors='ignore')
-                        if error_msg:
-                            self.logger.error(f"❌ 错误详情: {error_msg}")
-
-                        # 特殊处理 405 状态码(WAF拦截)
-                        if response.status_code == 405:
-                            self.logger.error(f"🚫 请求被上游WAF拦截,可能是请求头或签名异常,请稍后重试...")
-                            error_response = {
-                                "error": {
-                                    "message": "请求被上游WAF拦截(405 Method Not Allowed),可能是请求头或签名异常,请稍后重试...",
-                                    "type": "waf_blocked",
-                                    "code": 405
-                                }
+            ) as response:
+                if response.status_code != 200:
+                    self.logger.error(f"❌ 上游返回错误: {response.status_code}")
+                    error_text = await read_capped(response)
+                    error_msg = error_text.decode('utf-8', errors='ignore')
+                    if error_msg:
+                        self.logger.error(f"❌ 错误详情: {error_msg}")
+
+                    # 特殊处理 405 状态码(WAF拦截)
+                    if response.status_code == 405:
+                        self.logger.error(f"🚫 请求被上游WAF拦截,可能是请求头或签名异常,请稍后重试...")
+                        error_response = {
+                            "error": {
+                                "message": "请求被上游WAF拦截(405 Method Not Allowed),可能是请求头或签名异常,请稍后重试...",
+                                "type": "waf_blocked",
+                                "code": 405
                             }
-                        else:
-                            error_response = {
-                                "error": {
-                                    "message": f"Upstream error: {response.status_code}",
-                                    "type": "upstream_error",
-                                    "code": response.status_code
-                                }
+                        }
+                    else:
+                        error_response = {
+                            "error": {
+                                "message": f"Upstream error: {response.status_code}",
+                                "type": "upstream_error",
+                                "code": response.status_code
                             }
-                        yield f"data: {json.dumps(error_response)}\n\n"
-                        yield "data: [DONE]\n\n"
-                        return
-
-                    if current_token and not settings.ANONYMOUS_MODE:
-                        token_pool = get_token_pool()
-                        if token_pool:
-                            token_pool.mark_token_success(current_token)
-
-                    chat_id = transformed["chat_id"]
-                    model = transformed["model"]
-                    async for chunk in self._handle_stream_response(response, chat_id, model, request, transformed):
-                        yield chunk
+                        }
+                    yield _SSE_DATA_PREFIX + orjson.dumps(error_response) + _SSE_FRAME_SUFFIX
+                    yield _SSE_DONE
                     return
+
+                if current_token and not settings.ANONYMOUS_MODE:
+                    token_pool = get_token_pool()
+                    if token_pool:
+                        token_pool.mark_token_success(current_token)
+
+                chat_id = transformed["chat_id"]
+                model = transformed["model"]
+                async for chunk in self._handle_stream_response(response, chat_id, model, request, transformed):
+                    yield chunk
+                return
         except Exception as e:
-            self.logger.error(f"❌ 流处理错误: {e}")
-            import traceback
-            self.logger.error(traceback.format_exc())
+            self.logger.exception("❌ 流处理错误: {}", e)
             if current_token and not settings.ANONYMOUS_MODE:
                 self.mark_token_failure(current_token, e)
             error_response = {
@@ -806,8 +958,8 @@ class ZAIProvider(BaseProvider):
                     "type": "stream_error"
                 }
             }
-            yield f"data: {json.dumps(error_response)}\n\n"
-            yield "data: [DONE]\n\n"
+            yield _SSE_DATA_PREFIX + orjson.dumps(error_response) + _SSE_FRAME_SUFFIX
+            yield _SSE_DONE
             return
 
     async def transform_response(
@@ -815,7 +967,7 @@ class ZAIProvider(BaseProvider):
         response: httpx.Response, 
         request: OpenAIRequest,
         transformed: Dict[str, Any]
-    ) -> Union[Dict[str, Any], AsyncGenerator[str, None]]:
+    ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """转换Z.AI响应为OpenAI格式"""
         chat_id = transformed["chat_id"]
         model = transformed["model"]
@@ -832,255 +984,241 @@ class ZAIProvider(BaseProvider):
         model: str,
         request: OpenAIRequest,
         transformed: Dict[str, Any]
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
         """处理Z.AI流式响应"""
-        self.logger.info(f"✅ Z.AI 响应成功，开始处理 SSE 流")
+        self.logger.info("✅ Z.AI 响应成功，开始处理 SSE 流")
 
         # 检查是否启用了工具调用 (通过检查原始请求)
         has_tools = settings.TOOL_SUPPORT and request.tools is not None and len(request.tools) > 0
 
-        # 累积内容缓冲区,用于提取工具调用
-        buffered_content = ""
+        # 累积内容片段,用于提取工具调用（仅在启用工具时收集，结束时一次拼接）
+        buffered_parts: List[str] = []
         has_sent_role = False
 
         # 处理状态
         has_thinking = False
         thinking_signature = None
 
+        # 预构建 chunk 模板，每个增量只替换 delta，避免逐 token 构造字典和 json.dumps
+        chunk_template = self.create_openai_chunk(chat_id, model, {})
+        chunk_choice = chunk_template["choices"][0]
+
+        def encode_chunk(
+            delta: Dict[str, Any],
+            finish_reason: Optional[str] = None,
+            usage: Optional[Dict[str, Any]] = None,
+        ) -> bytes:
+            chunk_choice["delta"] = delta
+            chunk_choice["finish_reason"] = finish_reason
+            # usage 只出现在结束帧上，在浅拷贝上添加，不写回模板
+            chunk = chunk_template if usage is None else {**chunk_template, "usage": usage}
+            return _SSE_DATA_PREFIX + orjson.dumps(chunk) + _SSE_FRAME_SUFFIX
+
+        # 首个角色帧每个流只编码一次
+        role_frame = encode_chunk({"role": "assistant"})
+
+        # 文本增量帧只有文本本身会变化：每个流预先切出 content / reasoning_content 帧的
+        # 固定前后缀，逐 token 只需 orjson 编码文本并拼接
+        delta_frame_parts = {}
+        for delta_field in ("content", "reasoning_content"):
+            frame = encode_chunk({"role": "assistant", delta_field: _DELTA_PLACEHOLDER})
+            prefix, _, suffix = frame.partition(_DELTA_PLACEHOLDER_JSON)
+            delta_frame_parts[delta_field] = (prefix, suffix)
+
+        # 合并短时间内到达的增量，减少逐 token flush
+        coalescer = DeltaCoalescer()
+
+        # 逐事件的调试日志只在调试模式下构造，避免每个 token 的格式化开销
+        debug_logging = settings.DEBUG_LOGGING
+
+        def encode_delta(field: str, text: str) -> bytes:
+            prefix, suffix = delta_frame_parts[field]
+            output_data = prefix + orjson.dumps(text) + suffix
+            if debug_logging:
+                self.logger.debug("➡️ 输出内容块到客户端: {}", output_data)
+            return output_data
+
+        def flush_pending() -> Optional[bytes]:
+            merged = coalescer.flush()
+            return encode_delta(*merged) if merged else None
+
         # 处理SSE流
-        buffer = ""
-        line_count = 0
+        event_count = 0
+        last_phase = None
         self.logger.debug("📡 开始接收 SSE 流数据...")
 
+        # 上游读取在独立任务中经有界队列预读，客户端较慢时不阻塞上游连接
+        upstream_events = iter_with_deadline(prefetch(iter_sse_events(response)), coalescer.timeout)
         try:
-            async for line in response.aiter_lines():
-                line_count += 1
-                if not line:
+            async for event in upstream_events:
+                if event is IDLE_TICK:
+                    pending_frame = flush_pending()
+                    if pending_frame:
+                        yield pending_frame
                     continue
 
-                # 累积到buffer处理完整的数据行
-                buffer += line + "\n"
-
-                # 检查是否有完整的data行
-                while "\n" in buffer:
-                    current_line, buffer = buffer.split("\n", 1)
-                    if not current_line.strip():
-                        continue
-
-                    if current_line.startswith("data:"):
-                        chunk_str = current_line[5:].strip()
-                        if not chunk_str or chunk_str == "[DONE]":
-                            if chunk_str == "[DONE]":
-                                yield "data: [DONE]\n\n"
-                            continue
-
-                        self.logger.debug(f"📦 解析数据块: {chunk_str[:1000]}..." if len(chunk_str) > 1000 else f"📦 解析数据块: {chunk_str}")
-
-                        try:
-                            chunk = json.loads(chunk_str)
-
-                            if chunk.get("type") == "chat:completion":
-                                data = chunk.get("data", {})
-                                phase = data.get("phase")
-
-                                # 记录每个阶段（只在阶段变化时记录）
-                                if phase and phase != getattr(self, '_last_phase', None):
-                                    self.logger.info(f"📈 SSE 阶段: {phase}")
-                                    self._last_phase = phase
-
-                                # 处理思考内容
-                                if phase == "thinking":
-                                    if not has_thinking:
-                                        has_thinking = True
-                                        # 发送初始角色
-                                        role_chunk = self.create_openai_chunk(
-                                            chat_id,
-                                            model,
-                                            {"role": "assistant"}
-                                        )
-                                        yield await self.format_sse_chunk(role_chunk)
-
-                                    delta_content = data.get("delta_content", "")
-                                    if delta_content:
-                                        # 处理思考内容格式
-                                        if delta_content.startswith("<details"):
-                                            content = (
-                                                delta_content.split("</summary>\n>")[-1].strip()
-                                                if "</summary>\n>" in delta_content
-                                                else delta_content
-                                            )
-                                        else:
-                                            content = delta_content
-
-                                        thinking_chunk = self.create_openai_chunk(
-                                            chat_id,
-                                            model,
-                                            {
-                                                "role": "assistant",
-                                                "reasoning_content": content
-                                            }
-                                        )
-                                        yield await self.format_sse_chunk(thinking_chunk)
-
-                                # 处理答案内容
-                                elif phase == "answer":
-                                    delta_content = data.get("delta_content", "")
-                                    edit_content = data.get("edit_content", "")
-
-                                    # 累积内容(用于工具调用提取)
-                                    if delta_content:
-                                        buffered_content += delta_content
-                                    elif edit_content:
-                                        buffered_content = edit_content
-
-                                    # 如果包含 usage,说明流式结束
-                                    if data.get("usage"):
-                                        usage = data["usage"]
-                                        self.logger.info(f"📦 完成响应 - 使用统计: {json.dumps(usage)}")
-
-                                        # 尝试从缓冲区提取 tool_calls
-                                        tool_calls = None
-
-                                        if has_tools:
-                                            tool_calls, _ = parse_and_extract_tool_calls(buffered_content)
-
-                                        if tool_calls:
-                                            # 发现工具调用
-                                            self.logger.info(f"🔧 从响应中提取到 {len(tool_calls)} 个工具调用")
-
-                                            if not has_sent_role:
-                                                role_chunk = self.create_openai_chunk(
-                                                    chat_id,
-                                                    model,
-                                                    {"role": "assistant"}
-                                                )
-                                                yield await self.format_sse_chunk(role_chunk)
-                                                has_sent_role = True
-
-                                            # 发送工具调用
-                                            for idx, tc in enumerate(tool_calls):
-                                                tool_chunk = self.create_openai_chunk(
-                                                    chat_id,
-                                                    model,
-                                                    {
-                                                        "role": "assistant",
-                                                        "tool_calls": [{
-                                                            "index": idx,
-                                                            "id": tc.get("id", f"call_{idx}"),
-                                                            "type": "function",
-                                                            "function": {
-                                                                "name": tc.get("function", {}).get("name", ""),
-                                                                "arguments": tc.get("function", {}).get("arguments", "")
-                                                            }
-                                                        }]
-                                                    }
-                                                )
-                                                yield await self.format_sse_chunk(tool_chunk)
-
-                                            # 发送完成块
-                                            finish_chunk = self.create_openai_chunk(
-                                                chat_id,
-                                                model,
-                                                {"role": "assistant"},
-                                                "tool_calls"
-                                            )
-                                            finish_chunk["usage"] = usage
-                                            yield await self.format_sse_chunk(finish_chunk)
-                                            yield "data: [DONE]\n\n"
-
-                                        else:
-                                            # 没有工具调用,流式内容已经在上面的增量输出中发送过了
-                                            # 这里只需要发送 finish 块即可,不要再次发送内容
-                                            if not has_sent_role and not has_thinking:
-                                                role_chunk = self.create_openai_chunk(
-                                                    chat_id,
-                                                    model,
-                                                    {"role": "assistant"}
-                                                )
-                                                yield await self.format_sse_chunk(role_chunk)
-                                                has_sent_role = True
-
-                                            finish_chunk = self.create_openai_chunk(
-                                                chat_id,
-                                                model,
-                                                {"role": "assistant", "content": ""},
-                                                "stop"
-                                            )
-                                            finish_chunk["usage"] = usage
-                                            yield await self.format_sse_chunk(finish_chunk)
-                                            yield "data: [DONE]\n\n"
-                                    else:
-                                        # 流式过程中,输出答案内容（即使有工具调用也要显示）
-                                        # 处理思考结束和答案开始
-                                        if edit_content and "</details>\n" in edit_content:
-                                            if has_thinking:
-                                                # 发送思考签名
-                                                thinking_signature = str(int(time.time() * 1000))
-                                                sig_chunk = self.create_openai_chunk(
-                                                    chat_id,
-                                                    model,
-                                                    {
-                                                        "role": "assistant",
-                                                        "thinking": {
-                                                            "content": "",
-                                                            "signature": thinking_signature,
-                                                        }
-                                                    }
-                                                )
-                                                yield await self.format_sse_chunk(sig_chunk)
-
-                                            # 提取答案内容
-                                            content_after = edit_content.split("</details>\n")[-1]
-                                            if content_after:
-                                                content_chunk = self.create_openai_chunk(
-                                                    chat_id,
-                                                    model,
-                                                    {
-                                                        "role": "assistant",
-                                                        "content": content_after
-                                                    }
-                                                )
-                                                yield await self.format_sse_chunk(content_chunk)
-
-                                        # 处理增量内容
-                                        elif delta_content:
-                                            if not has_sent_role and not has_thinking:
-                                                role_chunk = self.create_openai_chunk(
-                                                    chat_id,
-                                                    model,
-                                                    {"role": "assistant"}
-                                                )
-                                                yield await self.format_sse_chunk(role_chunk)
-                                                has_sent_role = True
-
-                                            content_chunk = self.create_openai_chunk(
-                                                chat_id,
-                                                model,
-                                                {
-                                                    "role": "assistant",
-                                                    "content": delta_content
+                chunk_bytes = event[0]
+                if not chunk_bytes:
+                    continue
+                event_count += 1
+
+                if chunk_bytes == b"[DONE]":
+                    pending_frame = flush_pending()
+                    if pending_frame:
+                        yield pending_frame
+                    yield _SSE_DONE
+                    continue
+
+                if debug_logging:
+                    self.logger.debug(
+                        "📦 解析数据块: {}{}",
+                        chunk_bytes[:1000].decode("utf-8", "replace"),
+                        "..." if len(chunk_bytes) > 1000 else "",
+                    )
+
+                try:
+                    chunk = orjson.loads(chunk_bytes)
+
+                    if chunk.get("type") == "chat:completion":
+                        # 每个事件只取一次所需字段
+                        data = chunk.get("data") or {}
+                        phase = data.get("phase")
+                        delta_content = data.get("delta_content", "")
+                        edit_content = data.get("edit_content", "")
+                        usage = data.get("usage")
+
+                        # 记录每个阶段（只在阶段变化时记录）
+                        if phase and phase != last_phase:
+                            self.logger.info("📈 SSE 阶段: {}", phase)
+                            last_phase = phase
+
+                        # 处理思考内容
+                        if phase == "thinking":
+                            if not has_thinking:
+                                has_thinking = True
+                                # 发送初始角色
+                                yield role_frame
+
+                            if delta_content:
+                                content = _clean_thinking_delta(delta_content)
+                                for field, text in coalescer.add("reasoning_content", content):
+                                    yield encode_delta(field, text)
+
+                        # 处理答案内容
+                        elif phase == "answer":
+                            # 累积内容(用于工具调用提取)
+                            if has_tools:
+                                if delta_content:
+                                    buffered_parts.append(delta_content)
+                                elif edit_content:
+                                    buffered_parts = [edit_content]
+
+                            # 如果包含 usage,说明流式结束
+                            if usage:
+                                self.logger.info("📦 完成响应 - 使用统计: {}", usage)
+
+                                pending_frame = flush_pending()
+                                if pending_frame:
+                                    yield pending_frame
+
+                                # 尝试从缓冲区提取 tool_calls
+                                tool_calls = None
+
+                                if has_tools:
+                                    tool_calls, _ = parse_and_extract_tool_calls("".join(buffered_parts))
+
+                                if tool_calls:
+                                    # 发现工具调用
+                                    self.logger.info("🔧 从响应中提取到 {} 个工具调用", len(tool_calls))
+
+                                    if not has_sent_role:
+                                        yield role_frame
+                                        has_sent_role = True
+
+                                    # 发送工具调用
+                                    for idx, tc in enumerate(tool_calls):
+                                        function = tc.get("function", {})
+                                        yield encode_chunk({
+                                            "role": "assistant",
+                                            "tool_calls": [{
+                                                "index": idx,
+                                                "id": tc.get("id", f"call_{idx}"),
+                                                "type": "function",
+                                                "function": {
+                                                    "name": function.get("name", ""),
+                                                    "arguments": function.get("arguments", "")
                                                 }
-                                            )
-                                            output_data = await self.format_sse_chunk(content_chunk)
-                                            self.logger.debug(f"➡️ 输出内容块到客户端: {output_data}")
-                                            yield output_data
+                                            }]
+                                        })
 
-                        except json.JSONDecodeError as e:
-                            self.logger.debug(f"❌ JSON解析错误: {e}, 内容: {chunk_str[:1000]}")
-                        except Exception as e:
-                            self.logger.error(f"❌ 处理chunk错误: {e}")
+                                    # 发送完成块
+                                    yield encode_chunk({"role": "assistant"}, "tool_calls", usage)
+                                    yield _SSE_DONE
 
-            self.logger.info(f"✅ SSE 流处理完成，共处理 {line_count} 行数据")
+                                else:
+                                    # 没有工具调用,流式内容已经在上面的增量输出中发送过了
+                                    # 这里只需要发送 finish 块即可,不要再次发送内容
+                                    if not has_sent_role and not has_thinking:
+                                        yield role_frame
+                                        has_sent_role = True
+
+                                    yield encode_chunk({"role": "assistant", "content": ""}, "stop", usage)
+                                    yield _SSE_DONE
+                            else:
+                                # 流式过程中,输出答案内容（即使有工具调用也要显示）
+                                # 处理思考结束和答案开始
+                                content_after = _answer_after_thinking(edit_content)
+                                if content_after is not None:
+                                    pending_frame = flush_pending()
+                                    if pending_frame:
+                                        yield pending_frame
+
+                                    if has_thinking:
+                                        # 发送思考签名
+                                        thinking_signature = str(int(time.time() * 1000))
+                                        yield encode_chunk({
+                                            "role": "assistant",
+                                            "thinking": {
+                                                "content": "",
+                                                "signature": thinking_signature,
+                                            }
+                                        })
+
+                                    # 输出答案内容
+                                    if content_after:
+                                        yield encode_delta("content", content_after)
+
+                                # 处理增量内容
+                                elif delta_content:
+                                    if not has_sent_role and not has_thinking:
+                                        yield role_frame
+                                        has_sent_role = True
+
+                                    for field, text in coalescer.add("content", delta_content):
+                                        yield encode_delta(field, text)
+
+                except orjson.JSONDecodeError as e:
+                    self.logger.debug("❌ JSON解析错误: {}, 内容: {!r}", e, chunk_bytes[:1000])
+                except Exception as e:
+                    self.logger.error(f"❌ 处理chunk错误: {e}")
+
+            pending_frame = flush_pending()
+            if pending_frame:
+                yield pending_frame
+
+            self.logger.info("✅ SSE 流处理完成，共处理 {} 个事件", event_count)
 
         except Exception as e:
-            self.logger.error(f"❌ 流式响应处理错误: {e}")
-            import traceback
-            self.logger.error(traceback.format_exc())
+            self.logger.exception("❌ 流式响应处理错误: {}", e)
+            pending_frame = flush_pending()
+            if pending_frame:
+                yield pending_frame
             # 发送错误结束块
-            yield await self.format_sse_chunk(
-                self.create_openai_chunk(chat_id, model, {}, "stop")
-            )
-            yield "data: [DONE]\n\n"
+            yield encode_chunk({}, "stop")
+            yield _SSE_DONE
+        finally:
+            # 提前结束（如客户端断开）时立即取消预读任务，不依赖垃圾回收关闭生成器链
+            await upstream_events.aclose()
     
     async def _handle_non_stream_response(
         self, 
@@ -1091,11 +1229,12 @@ class ZAIProvider(BaseProvider):
         """处理非流式响应
 
         说明：上游始终以 SSE 形式返回（transform_request 固定 stream=True），
-        因此这里需要聚合 aiter_lines() 的 data: 块，提取 usage、思考内容与答案内容，
+        因此这里需要聚合 SSE 事件的 data 负载，提取 usage、思考内容与答案内容，
         并最终产出一次性 OpenAI 格式响应。
         """
-        final_content = ""
-        reasoning_content = ""
+        # 增量片段先收集到列表，结束时一次拼接，避免长回答反复复制字符串
+        content_parts: List[str] = []
+        reasoning_parts: List[str] = []
         usage_info: Dict[str, int] = {
             "prompt_tokens": 0,
             "completion_tokens": 0,
@@ -1103,17 +1242,11 @@ class ZAIProvider(BaseProvider):
         }
 
         try:
-            async for line in response.aiter_lines():
-                if not line:
-                    continue
-
-                line = line.strip()
-
-                # 仅处理以 data: 开头的 SSE 行，其余行尝试作为错误/JSON 忽略
-                if not line.startswith("data:"):
-                    # 尝试解析为错误 JSON
+            async for data_bytes, frame in iter_sse_events(response):
+                # 非 SSE data 事件尝试作为错误 JSON 处理
+                if data_bytes is None:
                     try:
-                        maybe_err = json.loads(line)
+                        maybe_err = orjson.loads(frame)
                         if isinstance(maybe_err, dict) and (
                             "error" in maybe_err or "code" in maybe_err or "message" in maybe_err
                         ):
@@ -1128,14 +1261,13 @@ class ZAIProvider(BaseProvider):
                         pass
                     continue
 
-                data_str = line[5:].strip()
-                if not data_str or data_str in ("[DONE]", "DONE", "done"):
+                if not data_bytes or data_bytes in (b"[DONE]", b"DONE", b"done"):
                     continue
 
                 # 解析 SSE 数据块
                 try:
-                    chunk = json.loads(data_str)
-                except json.JSONDecodeError:
+                    chunk = orjson.loads(data_bytes)
+                except orjson.JSONDecodeError:
                     continue
 
                 if chunk.get("type") != "chat:completion":
@@ -1156,36 +1288,26 @@ class ZAIProvider(BaseProvider):
                 # 思考阶段聚合（去除 <details><summary>... 包裹头）
                 if phase == "thinking":
                     if delta_content:
-                        if delta_content.startswith("<details"):
-                            cleaned = (
-                                delta_content.split("</summary>\n>")[-1].strip()
-                                if "</summary>\n>" in delta_content
-                                else delta_content
-                            )
-                        else:
-                            cleaned = delta_content
-                        reasoning_content += cleaned
+                        reasoning_parts.append(_clean_thinking_delta(delta_content))
 
                 # 答案阶段聚合
                 elif phase == "answer":
                     # 当 edit_content 同时包含思考结束标记与答案时，提取答案部分
-                    if edit_content and "</details>\n" in edit_content:
-                        content_after = edit_content.split("</details>\n")[-1]
+                    content_after = _answer_after_thinking(edit_content)
+                    if content_after is not None:
                         if content_after:
-                            final_content += content_after
+                            content_parts.append(content_after)
                     elif delta_content:
-                        final_content += delta_content
+                        content_parts.append(delta_content)
 
         except Exception as e:
-            self.logger.error(f"❌ 非流式响应处理错误: {e}")
-            import traceback
-            self.logger.error(traceback.format_exc())
+            self.logger.exception("❌ 非流式响应处理错误: {}", e)
             # 返回统一错误响应
             return self.handle_error(e, "非流式聚合")
 
         # 清理并返回
-        final_content = (final_content or "").strip()
-        reasoning_content = (reasoning_content or "").strip()
+        final_content = "".join(content_parts).strip()
+        reasoning_content = "".join(reasoning_parts).strip()
 
         # 若没有聚合到答案，但有思考内容，则保底返回思考内容
         if not final_content and reasoning_content:
@@ -2,6 +2,7 @@
 Token 数据访问层 (DAO)
 提供 Token 的 CRUD 操作和查询功能
 """
+import asyncio
 import aiosqlite
 import sqlite3
 from typing import List, Optional, Dict, Tuple
@@ -12,6 +13,18 @@ import os
 from app.models.token_db import SQL_CREATE_TABLES, DB_PATH
 from app.utils.logger import logger
 
+# 批量添加/验证 Token 时同时进行的上游验证请求数
+TOKEN_VALIDATION_CONCURRENCY = 8
+
+# 每个连接打开后执行的 PRAGMA（journal_mode=WAL 已在建库时持久设置）：
+# WAL 下 synchronous=NORMAL 足够安全且减少 fsync；等锁最多 5 秒而不是直接报 SQLITE_BUSY
+_CONNECTION_PRAGMAS = """
+PRAGMA foreign_keys = ON;
+PRAGMA synchronous = NORMAL;
+PRAGMA busy_timeout = 5000;
+PRAGMA temp_store = MEMORY;
+"""
+
 
 class TokenDAO:
     """Token 数据访问对象"""
@@ -33,8 +46,8 @@ class TokenDAO:
         conn = await aiosqlite.connect(self.db_path)
         conn.row_factory = aiosqlite.Row  # 返回字典式结果
 
-        # 启用外键约束（SQLite 默认关闭）
-        await conn.execute("PRAGMA foreign_keys = ON")
+        # 启用外键约束（SQLite 默认关闭）等连接级设置，一次提交全部语句
+        await conn.executescript(_CONNECTION_PRAGMAS)
 
         try:
             yield conn
@@ -44,8 +57,8 @@ class TokenDAO:
     def get_sync_connection(self):
         """获取同步数据库连接（用于初始化）"""
         conn = sqlite3.connect(self.db_path)
-        # 启用外键约束
-        conn.execute("PRAGMA foreign_keys = ON")
+        # 启用外键约束等连接级设置
+        conn.executescript(_CONNECTION_PRAGMAS)
         return conn
 
     async def init_database(self):
@@ -53,6 +66,8 @@ class TokenDAO:
         try:
             # 使用同步连接创建表（避免异步初始化问题）
             conn = self.get_sync_connection()
+            # WAL 模式写入不阻塞读取，设置后持久保存在数据库文件中
+            conn.execute("PRAGMA journal_mode=WAL")
             conn.executescript(SQL_CREATE_TABLES)
             conn.commit()
             conn.close()
@@ -259,6 +274,34 @@ class TokenDAO:
         except Exception as e:
             logger.error(f"❌ 记录失败失败: {e}")
 
+    async def record_usage_batch(self, usage: List[Tuple[int, int, int]]):
+        """
+        批量累加 Token 使用统计，所有更新在同一个连接和事务内完成
+
+        Args:
+            usage: [(token_id, 成功次数, 失败次数), ...]
+        """
+        if not usage:
+            return
+
+        try:
+            async with self.get_connection() as conn:
+                await conn.executemany("""
+                    UPDATE token_stats
+                    SET total_requests = total_requests + :success + :failure,
+                        successful_requests = successful_requests + :success,
+                        failed_requests = failed_requests + :failure,
+                        last_success_time = CASE WHEN :success > 0 THEN CURRENT_TIMESTAMP ELSE last_success_time END,
+                        last_failure_time = CASE WHEN :failure > 0 THEN CURRENT_TIMESTAMP ELSE last_failure_time END
+                    WHERE token_id = :token_id
+                """, [
+                    {"token_id": token_id, "success": success, "failure": failure}
+                    for token_id, success, failure in usage
+                ])
+                await conn.commit()
+        except Exception as e:
+            logger.error(f"❌ 批量记录使用统计失败: {e}")
+
     async def get_token_stats(self, token_id: int) -> Optional[Dict]:
         """获取 Token 统计信息"""
         try:
@@ -293,21 +336,18 @@ class TokenDAO:
         Returns:
             (成功添加数量, 失败数量)
         """
-        added_count = 0
-        failed_count = 0
-
-        for token in tokens:
-            if token.strip():  # 过滤空 token
-                token_id = await self.add_token(
-                    provider,
-                    token.strip(),
-                    token_type,
-                    validate=validate
-                )
-                if token_id:
-                    added_count += 1
-                else:
-                    failed_count += 1
+        # 每个 Token 的验证是独立的网络请求，限制并发后同时进行
+        semaphore = asyncio.Semaphore(TOKEN_VALIDATION_CONCURRENCY)
+
+        async def add_one(token: str) -> Optional[int]:
+            async with semaphore:
+                return await self.add_token(provider, token, token_type, validate=validate)
+
+        results = await asyncio.gather(*(
+            add_one(token.strip()) for token in tokens if token.strip()  # 过滤空 token
+        ))
+        added_count = sum(1 for token_id in results if token_id)
+        failed_count = len(results) - added_count
 
         logger.info(f"✅ 批量添加完成: {provider} - 成功 {added_count}/{len(tokens)}，失败 {failed_count}")
         return added_count, failed_count
@@ -434,19 +474,25 @@ class TokenDAO:
             logger.info(f"🔍 开始批量验证 {len(tokens)} 个 {provider} Token...")
 
             stats = {"valid": 0, "guest": 0, "invalid": 0}
+            semaphore = asyncio.Semaphore(TOKEN_VALIDATION_CONCURRENCY)
+
+            async def validate_one(token_id: int) -> str:
+                async with semaphore:
+                    await self.validate_and_update_token(token_id)
 
-            for token_record in tokens:
-                token_id = token_record["id"]
-                is_valid = await self.validate_and_update_token(token_id)
+                    # 重新查询更新后的类型
+                    async with self.get_connection() as conn:
+                        cursor = await conn.execute("""
+                            SELECT token_type FROM tokens WHERE id = ?
+                        """, (token_id,))
+                        row = await cursor.fetchone()
+                        return row["token_type"] if row else "unknown"
 
-                # 重新查询更新后的类型
-                async with self.get_connection() as conn:
-                    cursor = await conn.execute("""
-                        SELECT token_type FROM tokens WHERE id = ?
-                    """, (token_id,))
-                    row = await cursor.fetchone()
-                    token_type = row["token_type"] if row else "unknown"
+            token_types = await asyncio.gather(*(
+                validate_one(token_record["id"]) for token_record in tokens
+            ))
 
+            for token_type in token_types:
                 if token_type == "user":
                     stats["valid"] += 1
                 elif token_type == "guest":
@@ -13,12 +13,14 @@ necessary.
 
 from __future__ import annotations
 
+import asyncio
 import re
 import time
 from typing import Optional
 
 import httpx
 
+from app.utils.http_client import get_http_client
 from app.utils.logger import get_logger
 from app.utils.user_agent import get_random_user_agent
 
@@ -32,7 +34,8 @@ _logger = get_logger()
 _version_pattern = re.compile(r"prod-fe-\d+\.\d+\.\d+")
 
 _cached_version: str = ""
-_cached_at: float = 0.0
+_cached_at: float = 0.0  # time.monotonic() timestamp of the last refresh
+_refresh_lock: Optional[asyncio.Lock] = None
 
 
 def _extract_version(page_content: str) -> Optional[str]:
@@ -58,7 +61,37 @@ def _should_use_cache(force_refresh: bool) -> bool:
         return False
     if _cached_at <= 0:
         return False
-    return (time.time() - _cached_at) < CACHE_TTL_SECONDS
+    return (time.monotonic() - _cached_at) < CACHE_TTL_SECONDS
+
+
+def _build_headers() -> dict:
+    """Build the request headers used to fetch the landing page."""
+    try:
+        return {"User-Agent": get_random_user_agent("chrome")}
+    except Exception:
+        return {
+            "User-Agent": (
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/120.0.0.0 Safari/537.36"
+            )
+        }
+
+
+def _store_version(page_content: str) -> str:
+    """Extract the version from the landing page and update the cache."""
+    global _cached_version, _cached_at
+
+    version = _extract_version(page_content)
+    if not version:
+        _logger.error("[Z.AI] Unable to locate X-FE-Version in landing page")
+        raise Exception("Unable to locate X-FE-Version in landing page")
+
+    if version != _cached_version:
+        _logger.info("[Z.AI] Detected X-FE-Version update: {}", version)
+    _cached_version = version
+    _cached_at = time.monotonic()
+    return version
 
 
 def get_latest_fe_version(force_refresh: bool = False) -> str:
@@ -68,45 +101,66 @@ def get_latest_fe_version(force_refresh: bool = False) -> str:
     The lookup order is:
         1. Cached value within TTL.
         2. Remote fetch from chat.z.ai.
+
+    This performs a blocking request on a cache miss; code running on the
+    event loop should use :func:`get_latest_fe_version_async` instead.
     
     Raises:
         Exception: If unable to fetch the version from the remote source.
     """
-    global _cached_version, _cached_at
-
     if _should_use_cache(force_refresh):
         return _cached_version
 
-    try:
-        headers = {"User-Agent": get_random_user_agent("chrome")}
-    except Exception:
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            )
-        }
-
     try:
         with httpx.Client(timeout=10.0, follow_redirects=True) as client:
-            response = client.get(FE_VERSION_SOURCE_URL, headers=headers)
+            response = client.get(FE_VERSION_SOURCE_URL, headers=_build_headers())
             response.raise_for_status()
-            version = _extract_version(response.text)
-            if version:
-                if version != _cached_version:
-                    _logger.info(f"[Z.AI] Detected X-FE-Version update: {version}")
-                _cached_version = version
-                _cached_at = time.time()
-                return version
-
-            _logger.error("[Z.AI] Unable to locate X-FE-Version in landing page")
-            raise Exception("Unable to locate X-FE-Version in landing page")
+            return _store_version(response.text)
     except Exception as exc:
         _logger.error(f"[Z.AI] Failed to fetch X-FE-Version from {FE_VERSION_SOURCE_URL}: {exc}")
         raise Exception(f"Failed to fetch X-FE-Version: {exc}")
 
 
+async def get_latest_fe_version_async(force_refresh: bool = False) -> str:
+    """
+    Async variant of :func:`get_latest_fe_version`.
+
+    Uses the shared upstream client so a cache miss does not block the event
+    loop, and serialises refreshes so concurrent requests trigger at most one
+    fetch.
+
+    Raises:
+        Exception: If unable to fetch the version from the remote source.
+    """
+    global _refresh_lock
+
+    if _should_use_cache(force_refresh):
+        return _cached_version
+
+    if _refresh_lock is None:
+        _refresh_lock = asyncio.Lock()
+
+    refresh_started = time.monotonic()
+    async with _refresh_lock:
+        # Another request may have refreshed the cache while we were waiting.
+        if _cached_at >= refresh_started and _should_use_cache(False):
+            return _cached_version
+
+        try:
+            client = get_http_client()
+            response = await client.get(
+                FE_VERSION_SOURCE_URL,
+                headers=_build_headers(),
+                timeout=10.0,
+                follow_redirects=True,
+            )
+            response.raise_for_status()
+            return _store_version(response.text)
+        except Exception as exc:
+            _logger.error(f"[Z.AI] Failed to fetch X-FE-Version from {FE_VERSION_SOURCE_URL}: {exc}")
+            raise Exception(f"Failed to fetch X-FE-Version: {exc}")
+
+
 def refresh_fe_version() -> str:
     """Force refresh the cached version by bypassing the TTL."""
     return get_latest_fe_version(force_refresh=True)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+共享的上游 HTTP 客户端
+
+每次请求新建 AsyncClient 都要重新握手 TCP/TLS，这里按代理地址复用长连接客户端，
+开启 HTTP/2 让并发请求复用同一连接。超时等参数仍由调用方按请求传入。
+"""
+
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Optional
+
+import httpx
+
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 上游连接池限制
+UPSTREAM_LIMITS = httpx.Limits(
+    max_connections=256,
+    max_keepalive_connections=64,
+    keepalive_expiry=300,
+)
+
+# 读取上游错误响应体的字节上限，只用于日志与错误提示
+ERROR_BODY_READ_LIMIT = 4096
+
+# 按代理地址区分的共享客户端，None 表示直连
+_clients: Dict[Optional[str], httpx.AsyncClient] = {}
+
+
+def _no_cookie_jar() -> CookieJar:
+    """
+    不保存任何 Cookie 的 CookieJar
+
+    客户端在所有请求之间共享，若保存上游下发的 Cookie 会把一个用户的会话带到其他请求中，
+    需要 Cookie 的调用方应显式通过请求头传递。
+    """
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+def get_http_client(proxy: Optional[str] = None) -> httpx.AsyncClient:
+    """获取（必要时创建）指定代理对应的共享 AsyncClient"""
+    client = _clients.get(proxy)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=True,
+            proxy=proxy,
+            limits=UPSTREAM_LIMITS,
+            timeout=30.0,
+            cookies=_no_cookie_jar(),
+        )
+        _clients[proxy] = client
+        logger.debug("🌐 创建共享 HTTP 客户端 (代理: {})", proxy or "无")
+    return client
+
+
+async def close_http_clients() -> None:
+    """关闭所有共享客户端，在应用关闭时调用"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
+
+
+async def read_capped(response: httpx.Response, limit: int = ERROR_BODY_READ_LIMIT) -> bytes:
+    """
+    读取流式响应体的前 limit 个字节
+
+    上游出错时可能返回很大的 HTML 错误页，这里只读取日志需要的前缀，其余部分随连接关闭丢弃。
+    """
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        if len(buffer) >= limit:
+            break
+    return bytes(buffer[:limit])
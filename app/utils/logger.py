@@ -34,7 +34,8 @@ def setup_logger(log_dir, log_retention_days=7, log_rotation="1 day", debug_mode
     )
 
     # 添加控制台输出（根据 debug_mode 设置级别）
-    logger.add(sys.stderr, level=log_level, format=console_format, colorize=True)
+    # enqueue=True 由后台线程写出，请求处理中的日志调用只做一次入队，不阻塞事件循环
+    logger.add(sys.stderr, level=log_level, format=console_format, colorize=True, enqueue=True)
 
     # 只有在 debug_mode 时才添加文件输出
     if debug_mode:
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+SSE 流式输出辅助模块
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, List, Optional, Tuple, TypeVar, Union
+
+import httpx
+import orjson
+
+T = TypeVar("T")
+
+# 上游 SSE 读取块大小与事件分隔符
+SSE_READ_CHUNK_SIZE = 16384
+SSE_EVENT_SEPARATOR = b"\n\n"
+
+# 上游读取任务与处理逻辑之间的事件队列长度
+PREFETCH_QUEUE_SIZE = 64
+
+# 增量合并阈值：累计字符数或首个增量等待时长任一达到即刷新
+COALESCE_MAX_CHARS = 4096
+COALESCE_MAX_DELAY = 0.015
+
+# 上游在截止时间内没有新数据时产出的哨兵
+IDLE_TICK = object()
+
+# 预读队列的结束标记
+_QUEUE_END = object()
+
+
+class _PumpError:
+    """预读任务中的异常，转交给消费方重新抛出"""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+async def _aclose(source: AsyncIterator) -> None:
+    """关闭异步生成器，普通异步迭代器没有 aclose 时忽略"""
+    aclose = getattr(source, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+def parse_sse_frame(frame: bytes) -> Optional[bytes]:
+    """
+    提取单个 SSE 事件的 data 负载
+
+    多个 data 行按规范以换行拼接；事件中没有 data 字段时返回 None。
+    """
+    if b"\n" not in frame:
+        if not frame.startswith(b"data:"):
+            return None
+        return frame[5:].strip()
+
+    parts = [line[5:].strip() for line in frame.split(b"\n") if line.startswith(b"data:")]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else b"\n".join(parts)
+
+
+def _frame_events(frame: bytes) -> List[Tuple[Optional[bytes], bytes]]:
+    """
+    将单个事件转换为 (data 负载, 原始事件字节) 列表
+
+    多个 data 行拼接后不是合法 JSON 时，多半是上游省略了事件之间的空行，
+    此时按行逐条产出，与逐行读取时的行为一致，不会整体解析失败而丢失内容。
+    """
+    data = parse_sse_frame(frame)
+    if data is None or b"\n" not in data:
+        return [(data, frame)]
+    try:
+        orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return [(line, frame) for line in data.split(b"\n") if line]
+    return [(data, frame)]
+
+
+async def iter_sse_events(
+    response: httpx.Response,
+    chunk_size: int = SSE_READ_CHUNK_SIZE,
+) -> AsyncIterator[Tuple[Optional[bytes], bytes]]:
+    """
+    按事件迭代上游 SSE 响应，产出 (data 负载, 原始事件字节)
+
+    直接在字节缓冲区上按空行切分事件，一个网络块中的多条消息一次处理完，
+    不做逐行解码；流结束时残留的非 SSE 内容（如错误 JSON）也会作为事件产出。
+    按规范 \r\n 与单独的 \r 都视为换行。
+    """
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes(chunk_size):
+        buffer += chunk
+        pending_cr = False
+        if b"\r" in buffer:
+            # 块末尾的 \r 可能与下一块开头的 \n 组成 \r\n，留到下一块再处理
+            pending_cr = buffer.endswith(b"\r")
+            if pending_cr:
+                del buffer[-1]
+            buffer = bytearray(buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n"))
+
+        start = 0
+        while True:
+            end = buffer.find(SSE_EVENT_SEPARATOR, start)
+            if end == -1:
+                break
+            frame = bytes(buffer[start:end]).strip(b"\n")
+            start = end + 2
+            if frame:
+                for event in _frame_events(frame):
+                    yield event
+        if start:
+            del buffer[:start]
+        if pending_cr:
+            buffer += b"\r"
+
+    tail = bytes(buffer).strip()
+    if tail:
+        for event in _frame_events(tail):
+            yield event
+
+
+async def prefetch(
+    source: AsyncIterator[T],
+    maxsize: int = PREFETCH_QUEUE_SIZE,
+) -> AsyncIterator[T]:
+    """
+    在后台任务中预读 source，经有界队列交给调用方
+
+    下游处理或客户端较慢时上游读取可以继续进行，队列满时读取任务暂停（背压），
+    内存占用有上限；调用方提前结束（如客户端断开）时取消读取任务并关闭 source。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def pump() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(_PumpError(e))
+            return
+        await queue.put(_QUEUE_END)
+
+    reader = asyncio.ensure_future(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _QUEUE_END:
+                return
+            if isinstance(item, _PumpError):
+                raise item.error
+            yield item
+    finally:
+        if not reader.done():
+            reader.cancel()
+            # 等待读取任务真正退出后再关闭 source，避免关闭仍在迭代中的生成器
+            await asyncio.wait((reader,))
+        await _aclose(source)
+
+
+class DeltaCoalescer:
+    """
+    将短时间内连续到达的同类增量文本合并为一个输出帧
+
+    高吐字速率下每个 token 一帧会带来大量 flush 和 TCP 小包，
+    合并后由调用方按 (字段名, 合并文本) 输出单个 chunk。
+    """
+
+    __slots__ = ("max_chars", "max_delay", "_field", "_parts", "_size", "_first_at")
+
+    def __init__(
+        self,
+        max_chars: int = COALESCE_MAX_CHARS,
+        max_delay: float = COALESCE_MAX_DELAY,
+    ):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._field: Optional[str] = None
+        self._parts: List[str] = []
+        self._size = 0
+        self._first_at = 0.0
+
+    def add(self, field: str, text: str) -> List[Tuple[str, str]]:
+        """追加增量，返回需要立即输出的合并结果（通常为空）"""
+        flushed = []
+        if self._parts and field != self._field:
+            flushed.append(self.flush())
+
+        if not self._parts:
+            self._field = field
+            self._first_at = time.monotonic()
+        self._parts.append(text)
+        self._size += len(text)
+
+        if (
+            self._size >= self.max_chars
+            or time.monotonic() - self._first_at >= self.max_delay
+        ):
+            flushed.append(self.flush())
+        return flushed
+
+    def flush(self) -> Optional[Tuple[str, str]]:
+        """取出当前合并的内容，没有待发送内容时返回 None"""
+        if not self._parts:
+            return None
+        parts = self._parts
+        merged = parts[0] if len(parts) == 1 else "".join(parts)
+        # 原地清空复用同一个列表，不在每次刷新时分配新对象
+        parts.clear()
+        self._size = 0
+        return self._field, merged
+
+    def timeout(self) -> Optional[float]:
+        """距离强制刷新的剩余时间，没有待发送内容时返回 None"""
+        if not self._parts:
+            return None
+        return max(0.0, self._first_at + self.max_delay - time.monotonic())
+
+
+async def iter_with_deadline(
+    source: AsyncIterator[T],
+    get_timeout: Callable[[], Optional[float]],
+) -> AsyncIterator[Union[T, object]]:
+    """
+    迭代上游数据，在 get_timeout() 给出的时间内没有新数据时产出 IDLE_TICK
+
+    等待中的读取任务不会因超时被取消（取消会破坏上游流），
+    下一轮继续等待同一个任务；没有截止时间时直接读取，不创建任务。
+    本生成器关闭时会一并关闭 source，调用方提前结束时应显式 aclose()。
+    """
+    iterator = source.__aiter__()
+    pending_next: Optional[asyncio.Future] = None
+    try:
+        while True:
+            timeout = get_timeout()
+            if pending_next is None:
+                if timeout is None:
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    yield item
+                    continue
+                pending_next = asyncio.ensure_future(iterator.__anext__())
+
+            if timeout is not None:
+                done, _ = await asyncio.wait((pending_next,), timeout=timeout)
+                if not done:
+                    yield IDLE_TICK
+                    continue
+
+            task, pending_next = pending_next, None
+            try:
+                item = await task
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if pending_next is not None and not pending_next.done():
+            pending_next.cancel()
+            await asyncio.wait((pending_next,))
+        await _aclose(iterator)
@@ -13,12 +13,15 @@ Token 池管理器 - 基于数据库的 Token 轮询和健康检查
 
 import asyncio
 import time
+from collections import Counter
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 from threading import Lock
 import httpx
+import orjson
 
 from app.utils.logger import logger
+from app.utils.http_client import get_http_client
 
 
 # ==================== Token 状态管理 ====================
@@ -117,14 +120,15 @@ class ZAITokenValidator:
             - error_message: 失败原因（仅在 is_valid=False 时有值）
         """
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.get(
-                    cls.AUTH_URL,
-                    headers=cls.get_headers(token)
-                )
+            client = get_http_client()
+            response = await client.get(
+                cls.AUTH_URL,
+                headers=cls.get_headers(token),
+                timeout=15.0,
+            )
 
-                # 解析响应
-                return cls._parse_auth_response(response)
+            # 解析响应
+            return cls._parse_auth_response(response)
 
         except httpx.TimeoutException:
             return ("unknown", False, "请求超时")
@@ -155,7 +159,7 @@ class ZAITokenValidator:
             return ("unknown", False, f"HTTP {response.status_code}")
 
         try:
-            data = response.json()
+            data = orjson.loads(response.content)
 
             # 验证响应格式
             if not isinstance(data, dict):
@@ -328,12 +332,16 @@ class TokenPool:
         with self._lock:
             available_count = len(self._get_available_user_tokens())
             total_count = len(self.token_statuses)
-            healthy_count = sum(1 for status in self.token_statuses.values() if status.is_healthy)
-
-            # 统计各类型 Token
-            user_count = sum(1 for s in self.token_statuses.values() if s.token_type == "user")
-            guest_count = sum(1 for s in self.token_statuses.values() if s.token_type == "guest")
-            unknown_count = sum(1 for s in self.token_statuses.values() if s.token_type == "unknown")
+            # 一次遍历统计健康数量与各类型 Token
+            healthy_count = 0
+            type_counts = Counter()
+            for status in self.token_statuses.values():
+                if status.is_healthy:
+                    healthy_count += 1
+                type_counts[status.token_type] += 1
+            user_count = type_counts["user"]
+            guest_count = type_counts["guest"]
+            unknown_count = type_counts["unknown"]
 
             status_info = {
                 "total_tokens": total_count,
@@ -582,17 +590,15 @@ async def sync_token_stats_to_db():
 
     dao = get_token_dao()
 
+    # 在锁内取快照，数据库写入不持有线程锁
     with pool._lock:
-        for token, status in pool.token_statuses.items():
-            token_id = status.token_id
-
-            # 更新数据库统计（简化版，实际可能需要增量更新）
-            if status.successful_requests > 0:
-                for _ in range(status.successful_requests):
-                    await dao.record_success(token_id)
+        usage = [
+            (status.token_id, status.successful_requests, status.total_requests - status.successful_requests)
+            for status in pool.token_statuses.values()
+            if status.total_requests > 0
+        ]
 
-            if status.total_requests - status.successful_requests > 0:
-                for _ in range(status.total_requests - status.successful_requests):
-                    await dao.record_failure(token_id)
+    # 更新数据库统计（简化版，实际可能需要增量更新）：每个 Token 一条语句，一次提交
+    await dao.record_usage_batch(usage)
 
     logger.info("✅ Token 统计已同步到数据库")
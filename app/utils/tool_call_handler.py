@@ -4,13 +4,54 @@
 工具调用处理模块
 """
 
-import json
+import orjson
 import re
 from typing import Dict, List, Any, Optional, Tuple
 from app.utils.logger import get_logger
 
 logger = get_logger()
 
+# 匹配 ```json ... ``` 或 ```...``` 代码块中的 JSON 对象
+_JSON_BLOCK_PATTERN = re.compile(r'```(?:json)?\s*\n?(\{[\s\S]*?\})\s*\n?```')
+# 连续三个及以上的换行
+_EXTRA_BLANK_LINES_PATTERN = re.compile(r'\n{3,}')
+# 括号匹配扫描时需要处理的字符
+_JSON_STRUCTURE_PATTERN = re.compile(r'[{}"\\]')
+
+
+def _find_json_object_end(text: str, start: int) -> int:
+    """
+    查找与 text[start] 处 '{' 匹配的 '}'
+
+    只在引号、反斜杠和花括号处停下处理，普通字符由正则整体跳过。
+
+    Returns:
+        int: 匹配的 '}' 之后的下标，括号不完整时返回 -1
+    """
+    depth = 0
+    in_string = False
+    pos = start
+    while True:
+        match = _JSON_STRUCTURE_PATTERN.search(text, pos)
+        if match is None:
+            return -1
+        k = match.start()
+        char = text[k]
+        if char == '\\':
+            # 转义符与其后的字符一起跳过
+            pos = k + 2
+            continue
+        if char == '"':
+            in_string = not in_string
+        elif not in_string:
+            if char == '{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return k + 1
+        pos = k + 1
+
 
 def generate_tool_prompt(tools: Optional[List[Dict[str, Any]]]) -> str:
     """
@@ -75,7 +116,7 @@ def generate_tool_prompt(tools: Optional[List[Dict[str, Any]]]) -> str:
         "---\n\n"
     )
 
-    logger.debug(f"生成工具提示词,包含 {len(tool_definitions)} 个工具定义")
+    logger.debug("生成工具提示词,包含 {} 个工具定义", len(tool_definitions))
     return prompt
 
 
@@ -131,7 +172,7 @@ def process_messages_with_tools(
         })
         processed.extend(messages)
 
-    logger.debug(f"工具提示已注入到消息列表,共 {len(processed)} 条消息")
+    logger.debug("工具提示已注入到消息列表,共 {} 条消息", len(processed))
     return processed
 
 
@@ -148,17 +189,22 @@ def parse_and_extract_tool_calls(content: str) -> Tuple[Optional[List[Dict[str,
     if not content or not content.strip():
         return None, content
 
+    # 快速排除：不含 tool_calls 键名的内容不可能解析出工具调用，跳过正则与逐字符扫描
+    if "tool_calls" not in content:
+        return None, content
+
     tool_calls = None
     cleaned_content = content
 
     # 方法1: 尝试解析 JSON 代码块中的 tool_calls
-    # 匹配 ```json ... ``` 或 ```...```
-    json_block_pattern = r'```(?:json)?\s*\n?(\{[\s\S]*?\})\s*\n?```'
-    json_blocks = re.findall(json_block_pattern, content)
+    json_blocks = _JSON_BLOCK_PATTERN.findall(content)
 
     for json_str in json_blocks:
+        # 不含键名的代码块不可能是工具调用，跳过解析与异常开销
+        if "tool_calls" not in json_str:
+            continue
         try:
-            parsed_data = json.loads(json_str)
+            parsed_data = orjson.loads(json_str)
             if "tool_calls" in parsed_data:
                 tool_calls = parsed_data["tool_calls"]
                 if tool_calls and isinstance(tool_calls, list):
@@ -169,66 +215,46 @@ def parse_and_extract_tool_calls(content: str) -> Tuple[Optional[List[Dict[str,
                             if func.get("arguments"):
                                 if isinstance(func["arguments"], dict):
                                     # 转换对象为 JSON 字符串
-                                    func["arguments"] = json.dumps(func["arguments"], ensure_ascii=False)
+                                    func["arguments"] = orjson.dumps(func["arguments"]).decode()
                                 elif not isinstance(func["arguments"], str):
                                     func["arguments"] = str(func["arguments"])
-                    logger.debug(f"从 JSON 代码块中提取到 {len(tool_calls)} 个工具调用")
+                    logger.debug("从 JSON 代码块中提取到 {} 个工具调用", len(tool_calls))
                     break
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             continue
 
     # 方法2: 尝试从文本中直接查找 JSON 对象
     if not tool_calls:
         # 查找包含 "tool_calls" 的 JSON 对象
-        i = 0
-        scannable_text = content
-        while i < len(scannable_text):
-            if scannable_text[i] == '{':
-                # 尝试找到匹配的闭合括号
-                brace_count = 1
-                j = i + 1
-                in_string = False
-                escape_next = False
-
-                while j < len(scannable_text) and brace_count > 0:
-                    if escape_next:
-                        escape_next = False
-                    elif scannable_text[j] == '\\':
-                        escape_next = True
-                    elif scannable_text[j] == '"':
-                        in_string = not in_string
-                    elif not in_string:
-                        if scannable_text[j] == '{':
-                            brace_count += 1
-                        elif scannable_text[j] == '}':
-                            brace_count -= 1
-                    j += 1
-
-                if brace_count == 0:
-                    # 找到完整的 JSON 对象
-                    json_candidate = scannable_text[i:j]
-                    try:
-                        parsed_data = json.loads(json_candidate)
-                        if "tool_calls" in parsed_data:
-                            tool_calls = parsed_data["tool_calls"]
-                            if tool_calls and isinstance(tool_calls, list):
-                                # 确保 arguments 字段是字符串
-                                for tc in tool_calls:
-                                    if tc.get("function"):
-                                        func = tc["function"]
-                                        if func.get("arguments"):
-                                            if isinstance(func["arguments"], dict):
-                                                func["arguments"] = json.dumps(func["arguments"], ensure_ascii=False)
-                                            elif not isinstance(func["arguments"], str):
-                                                func["arguments"] = str(func["arguments"])
-                                logger.debug(f"从内联 JSON 中提取到 {len(tool_calls)} 个工具调用")
-                                break
-                    except json.JSONDecodeError:
-                        pass
-
-                i = j
-            else:
-                i += 1
+        i = content.find('{')
+        while i != -1:
+            j = _find_json_object_end(content, i)
+            if j == -1:
+                break
+
+            if "tool_calls" in content[i:j]:
+                # 找到完整且包含 tool_calls 的 JSON 对象
+                json_candidate = content[i:j]
+                try:
+                    parsed_data = orjson.loads(json_candidate)
+                    if "tool_calls" in parsed_data:
+                        tool_calls = parsed_data["tool_calls"]
+                        if tool_calls and isinstance(tool_calls, list):
+                            # 确保 arguments 字段是字符串
+                            for tc in tool_calls:
+                                if tc.get("function"):
+                                    func = tc["function"]
+                                    if func.get("arguments"):
+                                        if isinstance(func["arguments"], dict):
+                                            func["arguments"] = orjson.dumps(func["arguments"]).decode()
+                                        elif not isinstance(func["arguments"], str):
+                                            func["arguments"] = str(func["arguments"])
+                            logger.debug("从内联 JSON 中提取到 {} 个工具调用", len(tool_calls))
+                            break
+                except orjson.JSONDecodeError:
+                    pass
+
+            i = content.find('{', j)
 
     # 清理内容 - 移除包含 tool_calls 的 JSON
     if tool_calls:
@@ -250,74 +276,67 @@ def remove_tool_json_content(content: str) -> str:
     if not content:
         return content
 
+    # 不含 tool_calls 时没有需要移除的 JSON，只做空白整理
+    if "tool_calls" not in content:
+        return _EXTRA_BLANK_LINES_PATTERN.sub('\n\n', content.strip())
+
     # 步骤1: 移除 JSON 代码块中包含 tool_calls 的部分
     cleaned_text = content
 
     # 匹配 ```json ... ``` 或 ```...```
     def replace_json_block(match):
         json_content = match.group(1)
+        if "tool_calls" not in json_content:
+            return match.group(0)
         try:
-            parsed_data = json.loads(json_content)
+            parsed_data = orjson.loads(json_content)
             if "tool_calls" in parsed_data:
                 return ""  # 移除整个代码块
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             pass
         return match.group(0)  # 保留原文
 
-    json_block_pattern = r'```(?:json)?\s*\n?(\{[\s\S]*?\})\s*\n?```'
-    cleaned_text = re.sub(json_block_pattern, replace_json_block, cleaned_text)
+    cleaned_text = _JSON_BLOCK_PATTERN.sub(replace_json_block, cleaned_text)
 
-    # 步骤2: 移除内联的 tool JSON - 使用括号平衡方法
+    # 步骤2: 移除内联的 tool JSON - 使用括号平衡方法，普通文本按片段整体保留
     result = []
     i = 0
 
-    while i < len(cleaned_text):
-        if cleaned_text[i] == '{':
-            # 尝试找到匹配的闭合括号
-            brace_count = 1
-            j = i + 1
-            in_string = False
-            escape_next = False
-
-            while j < len(cleaned_text) and brace_count > 0:
-                if escape_next:
-                    escape_next = False
-                elif cleaned_text[j] == '\\':
-                    escape_next = True
-                elif cleaned_text[j] == '"':
-                    in_string = not in_string
-                elif not in_string:
-                    if cleaned_text[j] == '{':
-                        brace_count += 1
-                    elif cleaned_text[j] == '}':
-                        brace_count -= 1
-                j += 1
-
-            if brace_count == 0:
-                # 找到完整的 JSON 对象,检查是否包含 tool_calls
-                json_candidate = cleaned_text[i:j]
-                try:
-                    parsed = json.loads(json_candidate)
-                    if "tool_calls" in parsed:
-                        # 这是一个工具调用,跳过它
-                        i = j
-                        continue
-                except json.JSONDecodeError:
-                    pass
+    while True:
+        k = cleaned_text.find('{', i)
+        if k == -1:
+            result.append(cleaned_text[i:])
+            break
+        result.append(cleaned_text[i:k])
+
+        j = _find_json_object_end(cleaned_text, k)
+        if j != -1 and "tool_calls" not in cleaned_text[k:j]:
+            # 完整对象中不含 tool_calls，其内部嵌套对象也不可能包含，整体保留并跳过
+            result.append(cleaned_text[k:j])
+            i = j
+            continue
 
-            # 不是工具调用或无法解析,保留这个字符
-            result.append(cleaned_text[i])
-            i += 1
-        else:
-            result.append(cleaned_text[i])
-            i += 1
+        if j != -1:
+            # 找到完整的 JSON 对象,检查是否为工具调用
+            try:
+                parsed = orjson.loads(cleaned_text[k:j])
+                if "tool_calls" in parsed:
+                    # 这是一个工具调用,跳过它
+                    i = j
+                    continue
+            except orjson.JSONDecodeError:
+                pass
+
+        # 不是工具调用或无法解析,保留这个字符
+        result.append('{')
+        i = k + 1
 
     cleaned_result = "".join(result).strip()
 
     # 移除多余的空白行
-    cleaned_result = re.sub(r'\n{3,}', '\n\n', cleaned_result)
+    cleaned_result = _EXTRA_BLANK_LINES_PATTERN.sub('\n\n', cleaned_result)
 
-    logger.debug(f"内容清理完成,原始长度: {len(content)}, 清理后长度: {len(cleaned_result)}")
+    logger.debug("内容清理完成,原始长度: {}, 清理后长度: {}", len(content), len(cleaned_result))
     return cleaned_result
 
 
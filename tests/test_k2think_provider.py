@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+K2Think 提供商响应解析测试
+"""
+
+import contextlib
+import os
+import sys
+
+import orjson
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.providers import k2think_provider
+from app.providers.k2think_provider import K2ThinkProvider
+
+FULL_CONTENT = (
+    '<details type="reasoning" done="true"><summary>Thinking</summary>想一想，再想</details>'
+    "<answer>答案是42</answer>"
+)
+
+
+class FakeResponse:
+    """一次性返回全部字节的上游响应"""
+
+    is_success = True
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def aiter_bytes(self, chunk_size=None):
+        yield self.data
+
+
+class FakeClient:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    @contextlib.asynccontextmanager
+    async def stream(self, *args, **kwargs):
+        yield FakeResponse(self.data)
+
+
+def _data_line(content: str) -> bytes:
+    return b"data: " + orjson.dumps({"choices": [{"delta": {"content": content}}]}) + b"\n"
+
+
+def _cumulative_body(separator: bytes) -> bytes:
+    """上游每个事件发送累计内容；separator 为空时模拟事件之间缺少空行"""
+    steps = [FULL_CONTENT[:n] for n in range(10, len(FULL_CONTENT), 9)] + [FULL_CONTENT]
+    return b"".join(_data_line(step) + separator for step in steps) + b"data: [DONE]\n\n"
+
+
+def test_is_end_marker_on_bytes():
+    provider = K2ThinkProvider()
+    for marker in (b"", b"-1", b"[DONE]", b"DONE", b"done"):
+        assert provider._is_end_marker(marker)
+    assert not provider._is_end_marker(b'{"done": true}')
+    assert not provider._is_end_marker(b"[DONE] ")
+
+
+def test_parse_data_string_on_bytes():
+    provider = K2ThinkProvider()
+    assert provider._parse_data_string(b'{"choices": [{"delta": {"content": "hi"}}]}') == "hi"
+    assert provider._parse_data_string(b'{"done": true}') == ""
+    assert provider._parse_data_string("纯文本".encode()) == "纯文本"
+
+
+async def _collect_stream(monkeypatch, body: bytes):
+    monkeypatch.setattr(k2think_provider, "get_http_client", lambda *args: FakeClient(body))
+    provider = K2ThinkProvider()
+    transformed = {"model": "MBZUAI-IFM/K2-Think", "headers": {}, "url": "u", "payload": {}}
+
+    reasoning, answer = [], []
+    async for frame in provider._handle_stream_request(transformed, None):
+        if frame.startswith(b"data: [DONE]"):
+            continue
+        delta = orjson.loads(frame[6:])["choices"][0]["delta"]
+        reasoning.append(delta.get("reasoning_content", ""))
+        answer.append(delta.get("content", ""))
+    return "".join(reasoning), "".join(answer)
+
+
+async def test_stream_with_and_without_blank_lines(monkeypatch):
+    expected = await _collect_stream(monkeypatch, _cumulative_body(b"\n"))
+    assert expected == ("想一想，再想", "答案是42")
+
+    # data 行之间缺少空行时逐行处理，JSON 文本不会混入推理或答案内容
+    assert await _collect_stream(monkeypatch, _cumulative_body(b"")) == expected
+
+
+async def test_non_stream_without_blank_lines():
+    provider = K2ThinkProvider()
+    response = await provider._handle_non_stream_response(
+        FakeResponse(_cumulative_body(b"")), "chat-1", "MBZUAI-IFM/K2-Think"
+    )
+    message = response["choices"][0]["message"]
+    assert message["content"] == "答案是42"
+    assert message["reasoning_content"] == "想一想，再想"
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SSE 流式输出辅助模块测试
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.sse import (
+    IDLE_TICK,
+    DeltaCoalescer,
+    iter_sse_events,
+    iter_with_deadline,
+    parse_sse_frame,
+    prefetch,
+)
+
+
+class FakeResponse:
+    """按固定块大小切分字节流的上游响应，记录是否被关闭"""
+
+    def __init__(self, data: bytes, chunk_size: int = 7, endless: bool = False):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.endless = endless
+        self.closed = False
+
+    async def aiter_bytes(self, chunk_size=None):
+        try:
+            while True:
+                for i in range(0, len(self.data), self.chunk_size):
+                    yield self.data[i:i + self.chunk_size]
+                    await asyncio.sleep(0)
+                if not self.endless:
+                    return
+        finally:
+            self.closed = True
+
+
+def test_parse_sse_frame():
+    assert parse_sse_frame(b"data: {}") == b"{}"
+    assert parse_sse_frame(b"event: ping") is None
+    assert parse_sse_frame(b"event: x\ndata: a\ndata: b") == b"a\nb"
+
+
+async def test_iter_sse_events_splits_across_chunks():
+    body = b"data: 1\r\n\r\n: comment\n\ndata: 2\n\n{\"code\": 1}"
+    events = [event async for event in iter_sse_events(FakeResponse(body, chunk_size=3))]
+    assert events == [
+        (b"1", b"data: 1"),
+        (None, b": comment"),
+        (b"2", b"data: 2"),
+        (None, b'{"code": 1}'),
+    ]
+
+
+async def test_iter_sse_events_accepts_lone_cr_line_endings():
+    body = b"data: 1\r\rdata: 2\r\n\r\ndata: 3\r\r"
+    for chunk_size in (1, 2, 3, 64):
+        events = [data async for data, _ in iter_sse_events(FakeResponse(body, chunk_size=chunk_size))]
+        assert events == [b"1", b"2", b"3"], chunk_size
+
+
+async def test_iter_sse_events_splits_data_lines_without_blank_line():
+    # 上游省略了事件之间的空行：拼接结果不是合法 JSON，应按行逐条产出
+    body = b'data: {"a": 1}\ndata: {"b": 2}\ndata: [DONE]\n\n'
+    events = [data async for data, _ in iter_sse_events(FakeResponse(body))]
+    assert events == [b'{"a": 1}', b'{"b": 2}', b"[DONE]"]
+
+    # 按规范拼接后是合法 JSON 的多行 data 保持为一个负载
+    body = b'data: {"a":\ndata: 1}\n\n'
+    events = [data async for data, _ in iter_sse_events(FakeResponse(body))]
+    assert events == [b'{"a":\n1}']
+
+
+async def test_prefetch_preserves_order():
+    body = b"".join(b"data: %d\n\n" % i for i in range(200))
+    events = [data async for data, _ in prefetch(iter_sse_events(FakeResponse(body)), maxsize=4)]
+    assert events == [b"%d" % i for i in range(200)]
+
+
+async def test_iter_with_deadline_closes_chain_on_early_exit():
+    response = FakeResponse(b"data: x\n\n", endless=True)
+    tasks_before = len(asyncio.all_tasks())
+
+    events = iter_with_deadline(prefetch(iter_sse_events(response)), lambda: 0.001)
+    received = 0
+    async for event in events:
+        if event is not IDLE_TICK:
+            received += 1
+        if received == 3:
+            break
+    await events.aclose()
+    await asyncio.sleep(0)
+
+    assert response.closed
+    assert len(asyncio.all_tasks()) == tasks_before
+
+
+def test_delta_coalescer_merges_and_switches_field():
+    coalescer = DeltaCoalescer(max_chars=10, max_delay=60)
+    assert coalescer.add("content", "ab") == []
+    assert coalescer.add("content", "cd") == []
+    assert coalescer.add("reasoning_content", "x") == [("content", "abcd")]
+    assert coalescer.add("reasoning_content", "0123456789") == [("reasoning_content", "x0123456789")]
+    assert coalescer.flush() is None
+    assert coalescer.timeout() is None